@@ -49,6 +49,7 @@ const apiHelpers = {
     // User management
     getUsers: () => api.get('/users'),
     createUser: (userData) => api.post('/users', userData),
+    bulkCreateUsers: (users) => api.post('/users/bulk', users),
     updateUser: (userId, userData) => api.put(`/users/${userId}`, userData),
     deleteUser: (userId) => api.delete(`/users/${userId}`),
     searchUsers: (query) => api.get('/users/search', { params: { query } }),
@@ -61,6 +62,9 @@ const apiHelpers = {
     changePassword: (passwordData) => api.post('/auth/change-password', passwordData),
     getCurrentUser: () => api.get('/auth/me'),
     
+    // Dashboard
+    getDashboardSummary: (recent = 10) => api.get('/dashboard/summary', { params: { recent } }),
+    
     // Requisitions
     getRequisitions: (type = null) => {
         const params = type ? { type } : {};
@@ -68,7 +72,17 @@ const apiHelpers = {
     },
     createRequisition: (requisitionData) => api.post('/requisitions', requisitionData),
     updateRequisition: (requisitionId, updateData) => api.put(`/requisitions/${requisitionId}`, updateData),
+    batchUpdateRequisitions: (ids, updateData) => api.post('/requisitions/batch-update', { ids, ...updateData }),
+    getRequisitionChangelog: (requisitionId) => api.get(`/requisitions/${requisitionId}/changelog`),
     deleteRequisition: (requisitionId) => api.delete(`/requisitions/${requisitionId}`),
+    exportRequisitions: (params = {}) => api.get('/requisitions/export', { params, responseType: 'blob' }),
+    
+    // Conference rooms
+    getRoomAvailability: (from, to) => api.get('/rooms/availability', { params: { from, to } }),
+    
+    // Leave calendar
+    getBusinessDays: (start, end) => api.get('/leave/business-days', { params: { start, end } }),
+    getHolidays: (year = null) => api.get('/holidays', { params: year ? { year } : {} }),
     
     // Leave replacement
     getReplacementConfirmation: (token) => api.get(`/leave/confirm/${token}`),
@@ -76,5 +90,76 @@ const apiHelpers = {
     getPendingReplacementRequests: () => api.get('/users/me/pending-replacement-requests')
 };
 
+// Subscribe to the requisition change feed (Server-Sent Events).
+// fetch is used instead of EventSource so the token travels in the Authorization
+// header; the stream is reopened with Last-Event-ID whenever the server closes it.
+function subscribeToRequisitionChanges(onEvent) {
+    let lastEventId = null;
+    let retryMs = 3000;
+    let stopped = false;
+    let controller = null;
+    
+    function dispatch(frame) {
+        let event = 'message';
+        let data = '';
+        frame.split('\n').forEach(line => {
+            if (line.startsWith('id: ')) lastEventId = line.slice(4);
+            else if (line.startsWith('event: ')) event = line.slice(7);
+            else if (line.startsWith('data: ')) data += line.slice(6);
+            else if (line.startsWith('retry: ')) retryMs = parseInt(line.slice(7), 10) || retryMs;
+        });
+        if (data) {
+            onEvent(event, JSON.parse(data));
+        }
+    }
+    
+    async function connect() {
+        const token = localStorage.getItem('auth_token');
+        if (!token || stopped) return;
+        
+        controller = new AbortController();
+        const headers = { Authorization: `Bearer ${token}` };
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+        
+        try {
+            const response = await fetch(`${API_BASE_URL}/stream/requisitions`, { headers, signal: controller.signal });
+            if (response.status === 401) return;
+            if (response.status === 503) {
+                // Retry-After: every stream slot is taken for now; without it the
+                // server cannot hold streams open, and pages work without live updates
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+                if (retryAfter && !stopped) setTimeout(connect, retryAfter * 1000);
+                return;
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    dispatch(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+            }
+        } catch (error) {
+            if (stopped) return;
+            console.error('Change feed error:', error);
+        }
+        
+        if (!stopped) setTimeout(connect, retryMs);
+    }
+    
+    connect();
+    return () => {
+        stopped = true;
+        if (controller) controller.abort();
+    };
+}
+
 // Export for global use
 window.apiHelpers = apiHelpers;
+window.subscribeToRequisitionChanges = subscribeToRequisitionChanges;
@@ -1,12 +1,30 @@
-from flask import Blueprint, request, jsonify, current_app
-from werkzeug.security import generate_password_hash
-from datetime import datetime, date
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from datetime import datetime, date, timedelta
+import csv
+import hashlib
+import io
 import json
 import secrets
 
-from app import db
-from models import User, Requisition, Counter
-from auth import token_required, role_required
+from sqlalchemy.exc import IntegrityError
+
+from app import db, limiter
+from models import (
+    User, Requisition, RequisitionEvent, Counter, Holiday, LeaveBalance,
+    REQUISITION_TYPES, REQUISITION_COMMON_FIELDS, REQUISITION_TYPE_FIELDS, REQUISITIONS_REVISION, USERS_REVISION,
+    HOLIDAYS_REVISION
+)
+from auth import token_required, role_required, invalidate_user_tokens, revoke_user_tokens
+from passwords import hash_password, hash_passwords
+import search
+import rooms
+from business_calendar import business_calendar, recompute_leave_totals
+import leave_balances
+import change_feed
+from serializers import encode_requisition, json_response, requisitions_array
+from utils import (
+    encode_cursor, decode_cursor, sql_statement_budget, etag_matches, not_modified, with_etag
+)
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -16,8 +34,12 @@ bp = Blueprint('api', __name__, url_prefix='/api')
 @role_required('it')
 def get_users(current_user):
     try:
+        etag = _revision_etag([USERS_REVISION])
+        if etag_matches(etag):
+            return not_modified(etag)
+        
         users = User.query.all()
-        return jsonify({'users': [user.to_dict() for user in users]}), 200
+        return with_etag(jsonify({'users': [user.to_dict() for user in users]}), etag), 200
     except Exception as e:
         current_app.logger.error(f"Get users error: {e}")
         return jsonify({'error': 'Failed to fetch users'}), 500
@@ -36,8 +58,7 @@ def create_user(current_user):
                 return jsonify({'error': f'{field} is required'}), 400
         
         # Validate role
-        valid_roles = ['employee', 'manager', 'it']
-        if data['role'] not in valid_roles:
+        if data['role'] not in VALID_ROLES:
             return jsonify({'error': 'Invalid role'}), 400
         
         # Check if username or email already exists
@@ -51,7 +72,7 @@ def create_user(current_user):
         user = User(
             username=data['username'],
             email=data['email'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=hash_password(data['password']),
             full_name=data['full_name'],
             designation=data.get('designation', ''),
             phone_extension=data.get('phone_extension', ''),
@@ -59,7 +80,9 @@ def create_user(current_user):
         )
         
         db.session.add(user)
+        Counter.bump(USERS_REVISION)
         db.session.commit()
+        search.index_user(user)
         
         return jsonify({
             'message': 'User created successfully',
@@ -70,6 +93,129 @@ def create_user(current_user):
         current_app.logger.error(f"Create user error: {e}")
         return jsonify({'error': 'Failed to create user'}), 500
 
+VALID_ROLES = ['employee', 'manager', 'it']
+# Rows accepted per import. Hashing takes ~0.1s of CPU per password, spread over
+# the password pool; gthread workers keep heartbeating while a request runs
+DEFAULT_BULK_USER_LIMIT = 5000
+BULK_INSERT_BATCH = 500
+
+@bp.route('/users/bulk', methods=['POST'])
+# Its own allowance, so a large import split over several requests does not use up the default limits
+@limiter.limit(lambda: current_app.config.get('BULK_USER_RATE_LIMIT') or '20 per hour')
+@token_required
+@role_required('it')
+def bulk_create_users(current_user):
+    try:
+        # Accept a JSON array (or {"users": [...]}) or a CSV upload with a header row
+        upload = request.files.get('file')
+        if upload is not None:
+            rows = list(csv.DictReader(io.StringIO(upload.read().decode('utf-8-sig'))))
+        elif request.mimetype == 'text/csv':
+            rows = list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+        else:
+            data = request.get_json()
+            rows = data.get('users') if isinstance(data, dict) else data
+        
+        if not isinstance(rows, list) or not rows:
+            return jsonify({'error': 'A non-empty list of users is required'}), 400
+        limit = current_app.config.get('BULK_USER_LIMIT') or DEFAULT_BULK_USER_LIMIT
+        if len(rows) > limit:
+            return jsonify({
+                'error': f'At most {limit} users can be imported at once; split the upload into smaller batches'
+            }), 400
+        
+        results = [{'row': i + 1, 'username': (row or {}).get('username') if isinstance(row, dict) else None}
+                   for i, row in enumerate(rows)]
+        
+        # Validate each row the same way create_user does
+        candidates = []
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results[i].update(status='error', error='Row must be an object')
+                continue
+            missing = [f for f in ['username', 'email', 'password', 'full_name', 'role'] if not row.get(f)]
+            if missing:
+                results[i].update(status='error', error=f'{missing[0]} is required')
+            elif row['role'] not in VALID_ROLES:
+                results[i].update(status='error', error='Invalid role')
+            else:
+                candidates.append(i)
+        
+        # Reject duplicates within the upload and against existing users with set-based lookups
+        taken_usernames, taken_emails = _existing_usernames_and_emails(
+            {rows[i]['username'] for i in candidates}, {rows[i]['email'] for i in candidates}
+        )
+        accepted = []
+        for i in candidates:
+            row = rows[i]
+            if row['username'] in taken_usernames:
+                results[i].update(status='error', error='Username already exists')
+            elif row['email'] in taken_emails:
+                results[i].update(status='error', error='Email already exists')
+            else:
+                taken_usernames.add(row['username'])
+                taken_emails.add(row['email'])
+                accepted.append(i)
+        
+        # Password hashing dominates the cost, so spread it over CPU cores
+        password_hashes = hash_passwords([rows[i]['password'] for i in accepted])
+        
+        for start in range(0, len(accepted), BULK_INSERT_BATCH):
+            batch = accepted[start:start + BULK_INSERT_BATCH]
+            values = [{
+                'username': rows[i]['username'],
+                'email': rows[i]['email'],
+                'password_hash': password_hash,
+                'full_name': rows[i]['full_name'],
+                'designation': rows[i].get('designation', ''),
+                'phone_extension': rows[i].get('phone_extension', ''),
+                'role': rows[i]['role']
+            } for i, password_hash in zip(batch, password_hashes[start:start + BULK_INSERT_BATCH])]
+            
+            try:
+                db.session.execute(User.__table__.insert(), values)
+                Counter.bump(USERS_REVISION)
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent insert claimed a username or email; report the batch as failed
+                db.session.rollback()
+                for i in batch:
+                    results[i].update(status='error', error='Username or email already exists')
+                continue
+            
+            ids = dict(db.session.query(User.username, User.id).filter(
+                User.username.in_([v['username'] for v in values])
+            ).all())
+            for i in batch:
+                results[i].update(status='created', id=ids.get(rows[i]['username']))
+        
+        created = sum(1 for r in results if r.get('status') == 'created')
+        return jsonify({
+            'message': f'{created} of {len(rows)} users created',
+            'created': created,
+            'failed': len(rows) - created,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Bulk create users error: {e}")
+        return jsonify({'error': 'Failed to import users'}), 500
+
+def _existing_usernames_and_emails(usernames, emails, chunk_size=500):
+    """Return the subsets of usernames and emails already taken, in a few IN queries"""
+    taken_usernames, taken_emails = set(), set()
+    usernames, emails = list(usernames), list(emails)
+    for start in range(0, max(len(usernames), len(emails)), chunk_size):
+        username_chunk = usernames[start:start + chunk_size]
+        email_chunk = emails[start:start + chunk_size]
+        matches = db.session.query(User.username, User.email).filter(
+            User.username.in_(username_chunk) | User.email.in_(email_chunk)
+        ).all()
+        taken_usernames.update(m.username for m in matches)
+        taken_emails.update(m.email for m in matches)
+    return taken_usernames & set(usernames), taken_emails & set(emails)
+
 @bp.route('/users/<int:user_id>', methods=['PUT'])
 @token_required
 @role_required('it')
@@ -77,6 +223,7 @@ def update_user(current_user, user_id):
     try:
         user = User.query.get_or_404(user_id)
         data = request.get_json()
+        previous_access = (user.role, user.is_active)
         
         # Update allowed fields
         if 'full_name' in data:
@@ -97,7 +244,15 @@ def update_user(current_user, user_id):
             user.is_active = data['is_active']
         
         user.updated_at = datetime.utcnow()
+        Counter.bump(USERS_REVISION)
         db.session.commit()
+        search.index_user(user)
+        
+        # Cached sessions carry role and is_active, so drop them when either changes
+        if previous_access[1] and not user.is_active:
+            revoke_user_tokens(user.id)
+        elif (user.role, user.is_active) != previous_access:
+            invalidate_user_tokens(user.id)
         
         return jsonify({
             'message': 'User updated successfully',
@@ -116,13 +271,8 @@ def search_users(current_user):
         if len(query) < 2:
             return jsonify({'users': []}), 200
         
-        users = User.query.filter(
-            User.is_active == True,
-            (User.full_name.ilike(f'%{query}%') | User.username.ilike(f'%{query}%'))
-        ).limit(10).all()
-        
         return jsonify({
-            'users': [{'id': u.id, 'full_name': u.full_name, 'username': u.username} for u in users]
+            'users': search.search_users(query, limit=10)
         }), 200
         
     except Exception as e:
@@ -150,7 +300,9 @@ def update_profile(current_user):
             current_user.phone_extension = data['phone_extension']
         
         current_user.updated_at = datetime.utcnow()
+        Counter.bump(USERS_REVISION)
         db.session.commit()
+        search.index_user(current_user)
         
         return jsonify({
             'message': 'Profile updated successfully',
@@ -162,7 +314,125 @@ def update_profile(current_user):
         return jsonify({'error': 'Failed to update profile'}), 500
 
 # Requisition Routes
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _leave_ready_for_approval():
+    """Leave requests reach managers once the replacement confirmed, or if none was named"""
+    return db.or_(
+        Requisition.replacement_confirmed == True,
+        Requisition.replacement_user_id.is_(None)
+    )
+
+def _requisition_listing_segments(current_user, query, req_type):
+    """Split the role-scoped listing into ordered (query, sort column) segments.
+
+    Each segment is read in descending (sort column, id) order and segments are
+    concatenated, which reproduces the role-specific ordering in SQL.
+    """
+    if current_user.role == 'employee':
+        # Employees can only see their own requisitions
+        query = query.filter(Requisition.user_id == current_user.id)
+        return [(query, Requisition.created_at)]
+    
+    if current_user.role == 'manager':
+        # Managers can see requisitions from other users that need approval
+        # They should NOT see their own requisitions as they are approvers
+        # For leave requests, only show if replacement is confirmed or no replacement needed
+        if req_type == 'leave':
+            query = query.filter(Requisition.user_id != current_user.id, _leave_ready_for_approval())
+        else:
+            query = query.filter(Requisition.user_id != current_user.id)
+        
+        # Show pending approvals first, then approved history
+        return [
+            (query.filter(Requisition.status == 'pending'), Requisition.created_at),
+            (query.filter(Requisition.status.in_(['approved', 'completed', 'declined'])), Requisition.updated_at)
+        ]
+    
+    if current_user.role == 'it':
+        # IT staff can see all requisitions, but sort with others' requests first, then own requests
+        return [
+            (query.filter(Requisition.user_id != current_user.id), Requisition.created_at),
+            (query.filter(Requisition.user_id == current_user.id), Requisition.created_at)
+        ]
+    
+    return [(query, Requisition.created_at)]
+
+def _is_valid_listing_cursor(cursor, segment_count):
+    """Check that a decoded cursor points into one of the listing segments"""
+    if not isinstance(cursor, dict):
+        return False
+    if not isinstance(cursor.get('s'), int) or not 0 <= cursor['s'] < segment_count:
+        return False
+    if not isinstance(cursor.get('i'), str) or not isinstance(cursor.get('t'), str):
+        return False
+    try:
+        datetime.fromisoformat(cursor['t'])
+    except ValueError:
+        return False
+    return True
+
+def _segment_page_query(query, sort_column, after, limit):
+    """Build the keyset query for one page of a listing segment"""
+    if after is not None:
+        sort_value = datetime.fromisoformat(after['t'])
+        query = query.filter(db.or_(
+            sort_column < sort_value,
+            db.and_(sort_column == sort_value, Requisition.id < after['i'])
+        ))
+    return Requisition.with_user_columns(query).order_by(
+        sort_column.desc(), Requisition.id.desc()
+    ).limit(limit)
+
+def _paginate_segments(segments, limit, cursor):
+    """Keyset-paginate over ordered listing segments.
+
+    Returns the rows of the requested page and the cursor for the next page, or
+    None when the listing is exhausted.
+    """
+    start_segment, after = (cursor['s'], cursor) if cursor else (0, None)
+    rows = []
+    
+    for index in range(start_segment, len(segments)):
+        query, sort_column = segments[index]
+        segment_after = after if index == start_segment else None
+        
+        # Fetch one extra row to know whether another page follows
+        needed = limit - len(rows) + 1
+        page = _segment_page_query(query, sort_column, segment_after, needed).all()
+        rows.extend((index, sort_column, r) for r in page)
+        if len(rows) > limit:
+            break
+    
+    if len(rows) <= limit:
+        return [r for _, _, r in rows], None
+    
+    rows = rows[:limit]
+    last_segment, sort_column, last = rows[-1]
+    next_cursor = encode_cursor({
+        's': last_segment,
+        't': getattr(last, sort_column.key).isoformat(),
+        'i': last.id
+    })
+    return [r for _, _, r in rows], next_cursor
+
+def _revision_etag(revision_names, *scope):
+    """Weak ETag for a response that depends only on the given revision counters and scope"""
+    revisions = Counter.get_values(revision_names)
+    raw = json.dumps([revisions, list(scope)], default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _requisition_listing_etag(current_user, req_type):
+    """ETag for a role-scoped requisition listing; user names are joined in, so users count too"""
+    types = [req_type] if req_type in REQUISITION_TYPES else REQUISITION_TYPES
+    revision_names = [REQUISITIONS_REVISION.format(t) for t in types] + [USERS_REVISION]
+    return _revision_etag(
+        revision_names, request.path, current_user.id, current_user.role, sorted(request.args.items())
+    )
+
 @bp.route('/requisitions', methods=['GET'])
+@sql_statement_budget(5)
 @token_required
 def get_requisitions(current_user):
     try:
@@ -173,47 +443,198 @@ def get_requisitions(current_user):
         if req_type:
             query = query.filter_by(requisition_type=req_type)
         
+        etag = _requisition_listing_etag(current_user, req_type)
+        if etag_matches(etag):
+            return not_modified(etag)
+        
         # Filter and sort based on user role
-        if current_user.role == 'employee':
-            # Employees can only see their own requisitions
-            query = query.filter_by(user_id=current_user.id)
-            requisitions = query.order_by(Requisition.created_at.desc()).all()
-        elif current_user.role == 'manager':
-            # Managers can see requisitions from other users that need approval
-            # They should NOT see their own requisitions as they are approvers
-            # For leave requests, only show if replacement is confirmed or no replacement needed
-            if req_type == 'leave':
-                query = query.filter(
-                    Requisition.user_id != current_user.id,
-                    db.or_(
-                        Requisition.replacement_confirmed == True,
-                        Requisition.replacement_user_id.is_(None)
-                    )
-                )
-            else:
-                query = query.filter(Requisition.user_id != current_user.id)
+        segments = _requisition_listing_segments(current_user, query, req_type)
+        
+        # Keyset pagination is opt-in so existing clients keep receiving the full list
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+            except ValueError:
+                return jsonify({'error': 'Invalid limit'}), 400
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
             
-            # Show pending approvals first, then approved history
-            pending_reqs = query.filter(Requisition.status == 'pending').order_by(Requisition.created_at.desc()).all()
-            approved_reqs = query.filter(Requisition.status.in_(['approved', 'completed', 'declined'])).order_by(Requisition.updated_at.desc()).all()
-            requisitions = pending_reqs + approved_reqs
-        elif current_user.role == 'it':
-            # IT staff can see all requisitions, but sort with others' requests first, then own requests
-            all_requisitions = query.order_by(Requisition.created_at.desc()).all()
-            others_requests = [r for r in all_requisitions if r.user_id != current_user.id]
-            own_requests = [r for r in all_requisitions if r.user_id == current_user.id]
-            requisitions = others_requests + own_requests
-        else:
-            requisitions = query.order_by(Requisition.created_at.desc()).all()
+            cursor = None
+            if request.args.get('cursor'):
+                cursor = decode_cursor(request.args['cursor'])
+                if not _is_valid_listing_cursor(cursor, len(segments)):
+                    return jsonify({'error': 'Invalid cursor'}), 400
+            
+            requisitions, next_cursor = _paginate_segments(segments, limit, cursor)
+            return with_etag(json_response({
+                'requisitions': requisitions_array(requisitions),
+                'next_cursor': next_cursor
+            }), etag), 200
         
-        return jsonify({
-            'requisitions': [req.to_dict() for req in requisitions]
-        }), 200
+        requisitions = []
+        for segment_query, sort_column in segments:
+            requisitions.extend(
+                Requisition.with_user_columns(segment_query).order_by(sort_column.desc()).all()
+            )
+        
+        return with_etag(json_response({
+            'requisitions': requisitions_array(requisitions)
+        }), etag), 200
         
     except Exception as e:
         current_app.logger.error(f"Get requisitions error: {e}")
         return jsonify({'error': 'Failed to fetch requisitions'}), 500
 
+# Dashboard Routes
+DEFAULT_RECENT_ITEMS = 10
+MAX_RECENT_ITEMS = 50
+
+@bp.route('/dashboard/summary', methods=['GET'])
+@sql_statement_budget(7)
+@token_required
+def get_dashboard_summary(current_user):
+    try:
+        try:
+            recent_limit = int(request.args.get('recent', DEFAULT_RECENT_ITEMS))
+        except ValueError:
+            return jsonify({'error': 'Invalid recent count'}), 400
+        recent_limit = max(0, min(recent_limit, MAX_RECENT_ITEMS))
+        
+        etag = _requisition_listing_etag(current_user, None)
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        # Same role scoping as GET /api/requisitions?type=<req_type>, for all types at once
+        query = Requisition.query
+        if current_user.role == 'manager':
+            query = query.filter(db.or_(Requisition.requisition_type != 'leave', _leave_ready_for_approval()))
+        segments = _requisition_listing_segments(current_user, query, None)
+        
+        counts = {req_type: {'total': 0, 'by_status': {}} for req_type in REQUISITION_TYPES}
+        recent = []
+        for segment_query, _ in segments:
+            type_status_counts = segment_query.with_entities(
+                Requisition.requisition_type, Requisition.status, db.func.count(Requisition.id)
+            ).group_by(Requisition.requisition_type, Requisition.status).all()
+            for req_type, status, count in type_status_counts:
+                if req_type not in counts:
+                    continue
+                by_status = counts[req_type]['by_status']
+                by_status[status] = by_status.get(status, 0) + count
+                counts[req_type]['total'] += count
+            
+            if recent_limit:
+                recent.extend(
+                    Requisition.with_user_columns(segment_query)
+                    .order_by(Requisition.created_at.desc())
+                    .limit(recent_limit)
+                    .all()
+                )
+        
+        recent.sort(key=lambda row: row.created_at or datetime.min, reverse=True)
+        
+        # Approvers see how many visible requests are waiting on them
+        pending_approvals = 0
+        if current_user.role in ['manager', 'it']:
+            pending_approvals = sum(c['by_status'].get('pending', 0) for c in counts.values())
+        
+        return with_etag(json_response({
+            'counts': counts,
+            'pending_approvals': pending_approvals,
+            'recent': requisitions_array(recent[:recent_limit])
+        }), etag), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get dashboard summary error: {e}")
+        return jsonify({'error': 'Failed to fetch dashboard summary'}), 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+EXPORT_BATCH_ROWS = 500
+
+@bp.route('/requisitions/export', methods=['GET'])
+@token_required
+def export_requisitions(current_user):
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid export format'}), 400
+        
+        req_type = request.args.get('type')
+        if req_type and req_type not in REQUISITION_TYPES:
+            return jsonify({'error': 'Invalid requisition type'}), 400
+        
+        # Optional inclusive date range on creation date
+        try:
+            date_from = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+            date_to = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('to') else None
+        except ValueError:
+            return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        
+        query = Requisition.query
+        if req_type:
+            query = query.filter_by(requisition_type=req_type)
+        if date_from:
+            query = query.filter(Requisition.created_at >= date_from)
+        if date_to:
+            query = query.filter(Requisition.created_at < date_to)
+        
+        # Export what the caller could list, oldest first within each role segment
+        segments = _requisition_listing_segments(current_user, query, req_type)
+        
+        def rows():
+            for segment_query, _ in segments:
+                yield from Requisition.with_user_columns(segment_query).order_by(
+                    Requisition.created_at, Requisition.id
+                ).yield_per(EXPORT_BATCH_ROWS)
+        
+        if export_format == 'csv':
+            types = [req_type] if req_type else REQUISITION_TYPES
+            fieldnames = REQUISITION_COMMON_FIELDS + [f for t in types for f in REQUISITION_TYPE_FIELDS[t]]
+            body = _stream_csv(rows(), fieldnames)
+        else:
+            body = _stream_ndjson(rows())
+        
+        filename = f"requisitions-{datetime.utcnow():%Y%m%d}.{export_format}"
+        return Response(
+            stream_with_context(body),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+        
+    except Exception as e:
+        current_app.logger.error(f"Export requisitions error: {e}")
+        return jsonify({'error': 'Failed to export requisitions'}), 500
+
+def _stream_csv(rows, fieldnames):
+    """Yield CSV text in batches, starting with the header"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue()
+    
+    for batch in _batched(rows, EXPORT_BATCH_ROWS):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(Requisition.serialize_rows(batch))
+        yield buffer.getvalue()
+
+def _stream_ndjson(rows):
+    """Yield one JSON document per line, in batches"""
+    for batch in _batched(rows, EXPORT_BATCH_ROWS):
+        yield ''.join(encode_requisition(row) + '\n' for row in batch)
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 @bp.route('/requisitions', methods=['POST'])
 @token_required
 def create_requisition(current_user):
@@ -225,9 +646,36 @@ def create_requisition(current_user):
             return jsonify({'error': 'Requisition type and subject are required'}), 400
         
         req_type = data['requisition_type']
-        if req_type not in ['it', 'conference_room', 'leave']:
+        if req_type not in REQUISITION_TYPES:
             return jsonify({'error': 'Invalid requisition type'}), 400
         
+        # Reject room bookings that overlap one already holding the room
+        if req_type == 'conference_room':
+            attendees_count = data.get('attendees_count')
+            if attendees_count in (None, ''):
+                attendees_count = None
+            else:
+                try:
+                    attendees_count = int(attendees_count)
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'Invalid attendees count'}), 400
+                if attendees_count < 1:
+                    return jsonify({'error': 'Invalid attendees count'}), 400
+            
+            start_datetime = rooms.parse_booking_datetime(data['start_datetime']) if data.get('start_datetime') else None
+            end_datetime = rooms.parse_booking_datetime(data['end_datetime']) if data.get('end_datetime') else None
+            if start_datetime and end_datetime and data.get('room_name'):
+                if end_datetime <= start_datetime:
+                    return jsonify({'error': 'End time must be after start time'}), 400
+                rooms.lock_room(data['room_name'])
+                conflict = rooms.find_conflict(data['room_name'], start_datetime, end_datetime)
+                if conflict:
+                    return jsonify({
+                        'error': f"{data['room_name']} is already booked by {conflict.display_id} "
+                                 f"from {conflict.start_datetime.isoformat()} to {conflict.end_datetime.isoformat()}",
+                        'conflict': conflict.display_id
+                    }), 409
+        
         # Generate display ID
         counter_name = f"{req_type}_requisition"
         counter_value = Counter.get_next_value(counter_name)
@@ -254,11 +702,9 @@ def create_requisition(current_user):
             requisition.it_category = data.get('it_category')
         elif req_type == 'conference_room':
             requisition.room_name = data.get('room_name')
-            if data.get('start_datetime'):
-                requisition.start_datetime = datetime.fromisoformat(data['start_datetime'].replace('Z', '+00:00'))
-            if data.get('end_datetime'):
-                requisition.end_datetime = datetime.fromisoformat(data['end_datetime'].replace('Z', '+00:00'))
-            requisition.attendees_count = data.get('attendees_count')
+            requisition.start_datetime = start_datetime
+            requisition.end_datetime = end_datetime
+            requisition.attendees_count = attendees_count
             requisition.equipment_needed = data.get('equipment_needed')
         elif req_type == 'leave':
             requisition.leave_type = data.get('leave_type')
@@ -266,7 +712,10 @@ def create_requisition(current_user):
                 requisition.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
             if data.get('end_date'):
                 requisition.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
-            requisition.total_days = data.get('total_days')
+            if requisition.start_date and requisition.end_date:
+                if requisition.end_date < requisition.start_date:
+                    return jsonify({'error': 'End date must not be before start date'}), 400
+                requisition.total_days = business_calendar.business_days(requisition.start_date, requisition.end_date)
             requisition.replacement_name = data.get('replacement_name')
             
             # Handle replacement user
@@ -276,26 +725,54 @@ def create_requisition(current_user):
                 requisition.replacement_token = secrets.token_urlsafe(32)
         
         # Initialize changelog
-        changelog_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'action': 'created',
-            'user': current_user.full_name,
-            'details': f"Requisition created by {current_user.full_name}"
-        }
-        requisition.changelog = json.dumps([changelog_entry])
+        RequisitionEvent.record(
+            requisition, 'created', current_user.full_name,
+            f"Requisition created by {current_user.full_name}"
+        )
         
         db.session.add(requisition)
+        Counter.bump(REQUISITIONS_REVISION.format(req_type))
         db.session.commit()
         
+        if req_type == 'conference_room':
+            rooms.room_schedule.apply(requisition)
+        
+        payload = requisition.to_dict()
+        change_feed.feed.publish('created', payload, change_feed.audience_of(requisition))
+        
         return jsonify({
             'message': 'Requisition created successfully',
-            'requisition': requisition.to_dict()
+            'requisition': payload
         }), 201
         
     except Exception as e:
         current_app.logger.error(f"Create requisition error: {e}")
         return jsonify({'error': 'Failed to create requisition'}), 500
 
+# Status changes allowed by update_requisition and batch_update_requisitions
+VALID_STATUS_TRANSITIONS = {
+    'pending': ['approved', 'declined', 'in_progress'],
+    'approved': ['completed', 'in_progress'],
+    'in_progress': ['completed', 'approved'],
+    'declined': ['pending'],
+    'completed': ['in_progress']
+}
+
+def _can_edit_requisition(current_user, requisition):
+    """Approvers can edit any requisition, employees only their own pending ones"""
+    return (
+        current_user.role in ['manager', 'it'] or 
+        (current_user.role == 'employee' and requisition.user_id == current_user.id and requisition.status == 'pending')
+    )
+
+def _reopens_booking(requisition, new_status):
+    """Whether a status change puts a declined room booking back in contention for its room"""
+    return (
+        requisition.status == 'declined' and new_status == 'pending' and
+        requisition.requisition_type == 'conference_room' and
+        requisition.room_name and requisition.start_datetime and requisition.end_datetime
+    )
+
 @bp.route('/requisitions/<requisition_id>', methods=['PUT'])
 @token_required
 def update_requisition(current_user, requisition_id):
@@ -304,55 +781,47 @@ def update_requisition(current_user, requisition_id):
         data = request.get_json()
         
         # Check permissions
-        can_edit = (
-            current_user.role in ['manager', 'it'] or 
-            (current_user.role == 'employee' and requisition.user_id == current_user.id and requisition.status == 'pending')
-        )
-        
-        if not can_edit:
+        if not _can_edit_requisition(current_user, requisition):
             return jsonify({'error': 'Insufficient permissions'}), 403
         
-        # Parse existing changelog
-        changelog = json.loads(requisition.changelog) if requisition.changelog else []
-        
         # Handle status updates
         if 'status' in data and data['status'] != requisition.status:
             old_status = requisition.status
             new_status = data['status']
             
             # Validate status transitions
-            valid_transitions = {
-                'pending': ['approved', 'declined', 'in_progress'],
-                'approved': ['completed', 'in_progress'],
-                'in_progress': ['completed', 'approved'],
-                'declined': ['pending'],
-                'completed': ['in_progress']
-            }
-            
-            if new_status not in valid_transitions.get(old_status, []):
+            if new_status not in VALID_STATUS_TRANSITIONS.get(old_status, []):
                 return jsonify({'error': f'Invalid status transition from {old_status} to {new_status}'}), 400
             
+            # Reopening a declined booking must not double-book its room
+            if _reopens_booking(requisition, new_status):
+                rooms.lock_room(requisition.room_name)
+                conflict = rooms.find_conflict(
+                    requisition.room_name, requisition.start_datetime, requisition.end_datetime,
+                    exclude_id=requisition.id
+                )
+                if conflict:
+                    return jsonify({
+                        'error': f'{requisition.room_name} has since been booked by {conflict.display_id}',
+                        'conflict': conflict.display_id
+                    }), 409
+            
             requisition.status = new_status
+            leave_balances.record_status_change(requisition, old_status)
             
             # Add changelog entry
-            changelog_entry = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'action': 'status_changed',
-                'user': current_user.full_name,
-                'details': f"Status changed from {old_status} to {new_status}"
-            }
-            changelog.append(changelog_entry)
+            RequisitionEvent.record(
+                requisition, 'status_changed', current_user.full_name,
+                f"Status changed from {old_status} to {new_status}"
+            )
         
         # Handle assignment (IT requisitions)
         if 'assigned_to' in data and requisition.requisition_type == 'it':
             requisition.assigned_to = data['assigned_to']
-            changelog_entry = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'action': 'assigned',
-                'user': current_user.full_name,
-                'details': f"Assigned to {data['assigned_to']}"
-            }
-            changelog.append(changelog_entry)
+            RequisitionEvent.record(
+                requisition, 'assigned', current_user.full_name,
+                f"Assigned to {data['assigned_to']}"
+            )
         
         # Update other editable fields
         editable_fields = ['subject', 'description', 'priority']
@@ -360,19 +829,179 @@ def update_requisition(current_user, requisition_id):
             if field in data:
                 setattr(requisition, field, data[field])
         
-        requisition.changelog = json.dumps(changelog)
         requisition.updated_at = datetime.utcnow()
+        Counter.bump(REQUISITIONS_REVISION.format(requisition.requisition_type))
         db.session.commit()
         
+        if requisition.requisition_type == 'conference_room':
+            rooms.room_schedule.apply(requisition)
+        
+        payload = requisition.to_dict()
+        change_feed.feed.publish('updated', payload, change_feed.audience_of(requisition))
+        
         return jsonify({
             'message': 'Requisition updated successfully',
-            'requisition': requisition.to_dict()
+            'requisition': payload
         }), 200
         
     except Exception as e:
         current_app.logger.error(f"Update requisition error: {e}")
         return jsonify({'error': 'Failed to update requisition'}), 500
 
+MAX_BATCH_UPDATE = 500
+
+@bp.route('/requisitions/batch-update', methods=['POST'])
+@token_required
+def batch_update_requisitions(current_user):
+    """Apply one status and/or assignment to many requisitions in a single transaction.
+
+    Each id is checked with the same permission and transition rules as
+    update_requisition; ids that fail are reported and skipped while the rest
+    are written with bulk statements and one commit.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return jsonify({'error': 'ids must be a non-empty list of requisition ids'}), 400
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > MAX_BATCH_UPDATE:
+            return jsonify({'error': f'At most {MAX_BATCH_UPDATE} requisitions can be updated at once'}), 400
+        if 'status' not in data and 'assigned_to' not in data:
+            return jsonify({'error': 'status or assigned_to is required'}), 400
+        
+        new_status = data.get('status')
+        rows = {
+            row.id: row
+            for row in Requisition.with_user_columns(Requisition.query.filter(Requisition.id.in_(ids))).all()
+        }
+        
+        now = datetime.utcnow()
+        results = {}
+        updates = []
+        events = []
+        status_changes = []
+        reopened = []  # bookings reopened by this batch, checked against each other
+        locked_rooms = set()
+        
+        for requisition_id in ids:
+            row = rows.get(requisition_id)
+            if row is None:
+                results[requisition_id] = {'result': 'not_found', 'error': 'Requisition not found'}
+                continue
+            if not _can_edit_requisition(current_user, row):
+                results[requisition_id] = {'result': 'forbidden', 'error': 'Insufficient permissions'}
+                continue
+            
+            changes = {}
+            row_events = []
+            if new_status is not None and new_status != row.status:
+                if new_status not in VALID_STATUS_TRANSITIONS.get(row.status, []):
+                    results[requisition_id] = {
+                        'result': 'invalid_transition',
+                        'error': f'Invalid status transition from {row.status} to {new_status}'
+                    }
+                    continue
+                
+                # Reopening a declined booking must not double-book its room
+                if _reopens_booking(row, new_status):
+                    if row.room_name not in locked_rooms:
+                        rooms.lock_room(row.room_name)
+                        locked_rooms.add(row.room_name)
+                    conflict = rooms.find_conflict(
+                        row.room_name, row.start_datetime, row.end_datetime, exclude_id=row.id
+                    )
+                    conflict_id = conflict.display_id if conflict else next((
+                        other.display_id for other in reopened
+                        if other.room_name == row.room_name and
+                        other.start_datetime < row.end_datetime and row.start_datetime < other.end_datetime
+                    ), None)
+                    if conflict_id:
+                        results[requisition_id] = {
+                            'result': 'conflict',
+                            'error': f'{row.room_name} has since been booked by {conflict_id}',
+                            'conflict': conflict_id
+                        }
+                        continue
+                    reopened.append(row)
+                
+                changes['status'] = new_status
+                status_changes.append((row, row.status, new_status))
+                row_events.append(('status_changed', f"Status changed from {row.status} to {new_status}"))
+            
+            # Assignment only applies to IT requisitions, as in update_requisition
+            if 'assigned_to' in data and row.requisition_type == 'it':
+                changes['assigned_to'] = data['assigned_to']
+                row_events.append(('assigned', f"Assigned to {data['assigned_to']}"))
+            
+            if not changes:
+                results[requisition_id] = {'result': 'unchanged'}
+                continue
+            
+            updates.append({'id': row.id, 'updated_at': now, **changes})
+            events.extend(
+                {'requisition_id': row.id, 'timestamp': now, 'action': action,
+                 'user': current_user.full_name, 'details': details}
+                for action, details in row_events
+            )
+        
+        updated_rows = []
+        if updates:
+            db.session.execute(db.update(Requisition), updates)
+            db.session.execute(db.insert(RequisitionEvent), events)
+            leave_balances.record_status_changes(status_changes)
+            for req_type in sorted({rows[update['id']].requisition_type for update in updates}):
+                Counter.bump(REQUISITIONS_REVISION.format(req_type))
+            db.session.commit()
+            
+            updated_ids = [update['id'] for update in updates]
+            updated_rows = Requisition.with_user_columns(
+                Requisition.query.filter(Requisition.id.in_(updated_ids))
+            ).all()
+            
+            bookings = [row for row in updated_rows if row.requisition_type == 'conference_room']
+            if bookings:
+                rooms.room_schedule.apply_many(bookings)
+            
+            for row, payload in zip(updated_rows, Requisition.serialize_rows(updated_rows)):
+                results[row.id] = {'result': 'updated', 'requisition': payload}
+                change_feed.feed.publish('updated', payload, change_feed.audience_of(row))
+        
+        return jsonify({
+            'results': [{'id': requisition_id, **results[requisition_id]} for requisition_id in ids],
+            'updated': len(updated_rows),
+            'failed': sum(1 for result in results.values() if 'error' in result)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Batch update requisitions error: {e}")
+        return jsonify({'error': 'Failed to update requisitions'}), 500
+
+@bp.route('/requisitions/<requisition_id>/changelog', methods=['GET'])
+@token_required
+def get_requisition_changelog(current_user, requisition_id):
+    try:
+        requisition = Requisition.query.get_or_404(requisition_id)
+        
+        # Same visibility as the listings: approvers see everything, others their own requests
+        can_view = (
+            current_user.role in ['manager', 'it'] or
+            current_user.id in (requisition.user_id, requisition.replacement_user_id)
+        )
+        if not can_view:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+        
+        events = requisition.events.order_by(
+            RequisitionEvent.timestamp, RequisitionEvent.id
+        ).all()
+        
+        return jsonify({'changelog': [event.to_dict() for event in events]}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get requisition changelog error: {e}")
+        return jsonify({'error': 'Failed to fetch changelog'}), 500
+
 @bp.route('/requisitions/<requisition_id>', methods=['DELETE'])
 @token_required
 def delete_requisition(current_user, requisition_id):
@@ -389,15 +1018,231 @@ def delete_requisition(current_user, requisition_id):
             return jsonify({'error': 'Insufficient permissions to delete this requisition'}), 403
         
         # Delete the requisition
+        notice, audience = change_feed.deletion_notice(requisition)
+        leave_balances.record_deletion(requisition)
         db.session.delete(requisition)
+        Counter.bump(REQUISITIONS_REVISION.format(requisition.requisition_type))
         db.session.commit()
         
+        if requisition.requisition_type == 'conference_room':
+            rooms.room_schedule.remove(requisition_id)
+        change_feed.feed.publish('deleted', notice, audience)
+        
         return jsonify({'message': 'Requisition deleted successfully'}), 200
         
     except Exception as e:
         current_app.logger.error(f"Delete requisition error: {e}")
         return jsonify({'error': 'Failed to delete requisition'}), 500
 
+# Seconds a client turned away by CHANGE_FEED_MAX_STREAMS waits before reconnecting
+STREAM_RETRY_AFTER = 30
+
+@bp.route('/stream/requisitions', methods=['GET'])
+@token_required
+def stream_requisitions(current_user):
+    # A stream occupies its thread for minutes; on a sync worker that is the whole worker
+    if not request.environ.get('wsgi.multithread') and not current_app.testing:
+        return jsonify({'error': 'Live updates are unavailable on this server'}), 503
+    # Leave the rest of the worker's threads to ordinary requests
+    if not change_feed.feed.open_stream(current_app.config.get('CHANGE_FEED_MAX_STREAMS', 4)):
+        response = jsonify({'error': 'Too many live update streams, try again later'})
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+        return response, 503
+    
+    user_id, role = current_user.id, current_user.role
+    last_event_id = request.headers.get('Last-Event-ID')
+    revision_names = [REQUISITIONS_REVISION.format(req_type) for req_type in REQUISITION_TYPES]
+    
+    def revisions():
+        values = Counter.get_values(revision_names)
+        # Hand the connection back to the pool between heartbeats
+        db.session.remove()
+        return dict(zip(REQUISITION_TYPES, values))
+    
+    db.session.remove()
+    response = Response(
+        stream_with_context(change_feed.stream_changes(user_id, role, last_event_id, revisions)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(change_feed.feed.close_stream)
+    return response
+
+MAX_AVAILABILITY_DAYS = 31
+
+@bp.route('/rooms/availability', methods=['GET'])
+@token_required
+def get_room_availability(current_user):
+    try:
+        if not request.args.get('from') or not request.args.get('to'):
+            return jsonify({'error': 'from and to are required'}), 400
+        try:
+            window_start = rooms.parse_booking_datetime(request.args['from'])
+            window_end = rooms.parse_booking_datetime(request.args['to'])
+        except ValueError:
+            return jsonify({'error': 'from and to must be ISO 8601 date-times'}), 400
+        
+        if window_end <= window_start:
+            return jsonify({'error': 'to must be after from'}), 400
+        if window_end - window_start > timedelta(days=MAX_AVAILABILITY_DAYS):
+            return jsonify({'error': f'Window cannot exceed {MAX_AVAILABILITY_DAYS} days'}), 400
+        
+        room_names = request.args.getlist('room') or None
+        availability = rooms.room_schedule.availability(window_start, window_end, room_names)
+        
+        return jsonify({
+            'from': window_start.isoformat(),
+            'to': window_end.isoformat(),
+            'rooms': [
+                {
+                    'room_name': room['room_name'],
+                    'bookings': [
+                        {
+                            'id': booking['id'],
+                            'display_id': booking['display_id'],
+                            'status': booking['status'],
+                            'start_datetime': booking['start'].isoformat(),
+                            'end_datetime': booking['end'].isoformat()
+                        }
+                        for booking in room['bookings']
+                    ],
+                    'free': [
+                        {'start_datetime': slot['start'].isoformat(), 'end_datetime': slot['end'].isoformat()}
+                        for slot in room['free']
+                    ]
+                }
+                for room in availability
+            ]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get room availability error: {e}")
+        return jsonify({'error': 'Failed to fetch room availability'}), 500
+
+@bp.route('/leave/balances', methods=['GET'])
+@token_required
+def get_leave_balances(current_user):
+    try:
+        year = request.args.get('year', type=int) or datetime.utcnow().year
+        user_id = request.args.get('user_id', type=int)
+        
+        # Employees only see their own balance; approvers may ask for anyone or everyone
+        if current_user.role == 'employee':
+            if user_id and user_id != current_user.id:
+                return jsonify({'error': 'Insufficient permissions'}), 403
+            user_id = current_user.id
+        
+        query = db.session.query(LeaveBalance, User.full_name).join(
+            User, User.id == LeaveBalance.user_id
+        ).filter(LeaveBalance.year == year)
+        if user_id:
+            query = query.filter(LeaveBalance.user_id == user_id)
+        
+        balances = {}
+        for balance, full_name in query.all():
+            entry = balances.setdefault(balance.user_id, {
+                'user_id': balance.user_id,
+                'full_name': full_name,
+                'days_taken': 0,
+                'by_type': {}
+            })
+            entry['days_taken'] += balance.days_taken
+            entry['by_type'][balance.leave_type] = {
+                'days_taken': balance.days_taken,
+                'requests': balance.requests
+            }
+        
+        return jsonify({'year': year, 'balances': list(balances.values())}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get leave balances error: {e}")
+        return jsonify({'error': 'Failed to fetch leave balances'}), 500
+
+@bp.route('/leave/business-days', methods=['GET'])
+@token_required
+def get_business_days(current_user):
+    try:
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end dates (YYYY-MM-DD) are required'}), 400
+    
+    try:
+        return jsonify({'total_days': business_calendar.business_days(start_date, end_date)}), 200
+    except Exception as e:
+        current_app.logger.error(f"Get business days error: {e}")
+        return jsonify({'error': 'Failed to calculate business days'}), 500
+
+@bp.route('/holidays', methods=['GET'])
+@token_required
+def get_holidays(current_user):
+    try:
+        query = Holiday.query
+        if request.args.get('year'):
+            year = request.args.get('year', type=int)
+            query = query.filter(Holiday.date >= date(year, 1, 1), Holiday.date <= date(year, 12, 31))
+        holidays = query.order_by(Holiday.date).all()
+        return jsonify({'holidays': [holiday.to_dict() for holiday in holidays]}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get holidays error: {e}")
+        return jsonify({'error': 'Failed to fetch holidays'}), 500
+
+@bp.route('/holidays', methods=['POST'])
+@token_required
+@role_required('it')
+def create_holiday(current_user):
+    try:
+        data = request.get_json()
+        if not data.get('date') or not data.get('name'):
+            return jsonify({'error': 'Date and name are required'}), 400
+        
+        holiday_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        if Holiday.query.filter_by(date=holiday_date).first():
+            return jsonify({'error': 'A holiday already exists on this date'}), 409
+        
+        holiday = Holiday(date=holiday_date, name=data['name'])
+        db.session.add(holiday)
+        Counter.bump(HOLIDAYS_REVISION)
+        db.session.commit()
+        
+        recomputed = recompute_leave_totals(holiday_date, holiday_date, current_user.full_name)
+        
+        return jsonify({
+            'message': 'Holiday created successfully',
+            'holiday': holiday.to_dict(),
+            'leave_requests_recalculated': recomputed
+        }), 201
+        
+    except Exception as e:
+        current_app.logger.error(f"Create holiday error: {e}")
+        return jsonify({'error': 'Failed to create holiday'}), 500
+
+@bp.route('/holidays/<int:holiday_id>', methods=['DELETE'])
+@token_required
+@role_required('it')
+def delete_holiday(current_user, holiday_id):
+    try:
+        holiday = Holiday.query.get_or_404(holiday_id)
+        holiday_date = holiday.date
+        
+        db.session.delete(holiday)
+        Counter.bump(HOLIDAYS_REVISION)
+        db.session.commit()
+        
+        recomputed = recompute_leave_totals(holiday_date, holiday_date, current_user.full_name)
+        
+        return jsonify({
+            'message': 'Holiday deleted successfully',
+            'leave_requests_recalculated': recomputed
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Delete holiday error: {e}")
+        return jsonify({'error': 'Failed to delete holiday'}), 500
+
 @bp.route('/leave/confirm/<token>', methods=['GET'])
 def get_replacement_confirmation(token):
     try:
@@ -436,37 +1281,30 @@ def confirm_replacement(token):
         # Update replacement confirmation
         requisition.replacement_confirmed = confirmed
         
-        # Parse existing changelog
-        changelog = json.loads(requisition.changelog) if requisition.changelog else []
-        
         # Add changelog entry
         replacement_name = requisition.replacement_user.full_name if requisition.replacement_user else requisition.replacement_name
         action = 'confirmed' if confirmed else 'declined'
-        changelog_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'action': f'replacement_{action}',
-            'user': replacement_name,
-            'details': f"Replacement {action} by {replacement_name}"
-        }
-        changelog.append(changelog_entry)
+        RequisitionEvent.record(
+            requisition, f'replacement_{action}', replacement_name,
+            f"Replacement {action} by {replacement_name}"
+        )
         
-        requisition.changelog = json.dumps(changelog)
         requisition.updated_at = datetime.utcnow()
         
         # If declined, reset status to pending
         if not confirmed and requisition.status == 'approved':
             requisition.status = 'pending'
-            changelog_entry = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'action': 'status_changed',
-                'user': 'System',
-                'details': 'Status reset to pending due to replacement decline'
-            }
-            changelog.append(changelog_entry)
-            requisition.changelog = json.dumps(changelog)
+            leave_balances.record_status_change(requisition, 'approved')
+            RequisitionEvent.record(
+                requisition, 'status_changed', 'System',
+                'Status reset to pending due to replacement decline'
+            )
         
+        Counter.bump(REQUISITIONS_REVISION.format(requisition.requisition_type))
         db.session.commit()
         
+        change_feed.publish_change('replacement_confirmed' if confirmed else 'updated', requisition)
+        
         return jsonify({
             'message': f'Replacement {"confirmed" if confirmed else "declined"} successfully'
         }), 200
@@ -475,19 +1313,23 @@ def confirm_replacement(token):
         current_app.logger.error(f"Confirm replacement error: {e}")
         return jsonify({'error': 'Failed to process confirmation'}), 500
 
+def _pending_replacement_query(current_user):
+    """Leave requests where the user is the replacement and confirmation is pending"""
+    return Requisition.query.filter(
+        Requisition.replacement_user_id == current_user.id,
+        Requisition.replacement_confirmed == False,
+        Requisition.requisition_type == 'leave'
+    )
+
 @bp.route('/users/me/pending-replacement-requests', methods=['GET'])
+@sql_statement_budget(3)
 @token_required
 def get_pending_replacement_requests(current_user):
     try:
-        # Find leave requests where current user is the replacement and confirmation is pending
-        requests = Requisition.query.filter(
-            Requisition.replacement_user_id == current_user.id,
-            Requisition.replacement_confirmed == False,
-            Requisition.requisition_type == 'leave'
-        ).all()
+        requests = Requisition.with_user_columns(_pending_replacement_query(current_user)).all()
         
-        return jsonify({
-            'requests': [req.to_dict() for req in requests]
+        return json_response({
+            'requests': requisitions_array(requests)
         }), 200
         
     except Exception as e:
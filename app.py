@@ -1,7 +1,7 @@
 import os
 import logging
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory
+import tempfile
+from flask import Flask, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_limiter import Limiter
@@ -9,72 +9,161 @@ from flask_limiter.util import get_remote_address
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+import ratelimit_storage  # registers the mmap:// storage scheme with limits
+from cache import TTLCache
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
 class Base(DeclarativeBase):
     pass
 
+# Extensions are created unbound and attached to each app in create_app
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__, static_folder='static')
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure CORS
-CORS(app, origins=["*"], supports_credentials=True)
-
 # Configure rate limiting
 limiter = Limiter(
-    app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"]
 )
 
-# Configure the database
-database_url = os.environ.get("DATABASE_URL", "sqlite:///pes_ems.db")
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the app with extensions
-db.init_app(app)
-
-# Serve static files
-@app.route('/')
-def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
-
-@app.route('/<path:path>')
-def serve_static(path):
-    return send_from_directory(app.static_folder, path)
-
-# Import models and routes after app initialization
-with app.app_context():
-    import models
+# Cache of validated tokens so repeat requests skip the token and user lookups; entries
+# are checked against the revocation list, so other workers' logouts and role changes
+# apply once it next syncs (JWT_DENYLIST_REFRESH)
+token_cache = TTLCache(
+    maxsize=int(os.environ.get("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("TOKEN_CACHE_TTL", "60"))
+)
+
+# Encoded requisition rows keyed by (id, updated_at, joined user columns); see serializers
+fragment_cache = TTLCache(
+    maxsize=int(os.environ.get("FRAGMENT_CACHE_SIZE", "50000")),
+    ttl=float(os.environ.get("FRAGMENT_CACHE_TTL", "3600"))
+)
+
+def config_from_env():
+    """Application settings read from the environment"""
+    return {
+        "SECRET_KEY": os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production"),
+        "SQLALCHEMY_DATABASE_URI": os.environ.get("DATABASE_URL", "sqlite:///pes_ems.db"),
+        "SQLALCHEMY_ENGINE_OPTIONS": {
+            "pool_recycle": 300,
+            "pool_pre_ping": True,
+        },
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "DISPLAY_ID_BLOCK_SIZE": int(os.environ.get("DISPLAY_ID_BLOCK_SIZE", "1")),
+        "PASSWORD_HASH_METHOD": os.environ.get("PASSWORD_HASH_METHOD", "scrypt"),
+        "PASSWORD_VERIFY_CONCURRENCY": int(os.environ.get("PASSWORD_VERIFY_CONCURRENCY", "0")) or None,
+        "PASSWORD_VERIFY_TIMEOUT": float(os.environ.get("PASSWORD_VERIFY_TIMEOUT", "10")),
+        "BULK_USER_LIMIT": int(os.environ.get("BULK_USER_LIMIT", "5000")),
+        "BULK_USER_RATE_LIMIT": os.environ.get("BULK_USER_RATE_LIMIT", "20 per hour"),
+        "JWT_STATELESS": os.environ.get("JWT_STATELESS", "false").lower() == "true",
+        "SQL_STATEMENT_BUDGETS": os.environ.get("SQL_STATEMENT_BUDGETS", "false").lower() == "true",
+        "CHANGE_FEED_HEARTBEAT": float(os.environ.get("CHANGE_FEED_HEARTBEAT", "15")),
+        "CHANGE_FEED_MAX_SECONDS": float(os.environ.get("CHANGE_FEED_MAX_SECONDS", "300")),
+        "CHANGE_FEED_BUFFER": int(os.environ.get("CHANGE_FEED_BUFFER", "256")),
+        # Open streams per worker; keep it below GUNICORN_THREADS
+        "CHANGE_FEED_MAX_STREAMS": int(os.environ.get("CHANGE_FEED_MAX_STREAMS", "4")),
+        "TOKEN_SWEEP_INTERVAL": float(os.environ.get("TOKEN_SWEEP_INTERVAL", "0")),
+        "RATELIMIT_ENABLED": os.environ.get("RATELIMIT_ENABLED", "true").lower() == "true",
+        # Counters shared by every worker on this host; see ratelimit_storage
+        "RATELIMIT_STORAGE_URI": os.environ.get(
+            "RATELIMIT_STORAGE_URI", "mmap://" + os.path.join(tempfile.gettempdir(), "pes-ratelimit.bin")
+        ),
+        "RATELIMIT_STRATEGY": os.environ.get("RATELIMIT_STRATEGY", "sliding-window-counter"),
+        "ASSET_BUILD_DIR": os.environ.get(
+            "ASSET_BUILD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "static_build")
+        ),
+        "METRICS_ENABLED": os.environ.get("METRICS_ENABLED", "true").lower() == "true",
+        "METRICS_TOKEN": os.environ.get("METRICS_TOKEN"),
+        # Directory shared by the workers on this host, so a scrape reports all of them; see metrics
+        "METRICS_DIR": os.environ.get("METRICS_DIR"),
+    }
+
+def register_blueprints(app):
+    """Import the route modules and attach their blueprints.
+
+    The imports happen here rather than at module level so that importing
+    app (for the extensions) stays cheap and free of route and model setup.
+    """
     import auth
     import api
-    
-    # Register blueprints
+
     app.register_blueprint(auth.bp)
     app.register_blueprint(api.bp)
+
+def register_commands(app):
+    import assets
+    import changelog
+    import leave_balances
+    import migrations
+    import sweeper
+
+    app.cli.add_command(assets.build_assets_command)
+    app.cli.add_command(migrations.init_db_command)
+    app.cli.add_command(migrations.migrate_command)
+    app.cli.add_command(changelog.migrate_changelogs_command)
+    app.cli.add_command(sweeper.sweep_tokens_command)
+    app.cli.add_command(leave_balances.rebuild_leave_balances_command)
+    app.cli.add_command(leave_balances.check_leave_balances_command)
+
+def create_app(config=None):
+    """Build a configured application.
+
+    No database work happens here: tables, migrations and seed rows are
+    handled by `flask init-db` / `flask migrate` (run once per deploy, see
+    gunicorn.conf.py), so booting a worker costs no round-trips.
+    """
+    app = Flask(__name__, static_folder='static')
+    app.config.update(config_from_env())
+    if config:
+        app.config.update(config)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure CORS
+    CORS(app, origins=["*"], supports_credentials=True)
+
+    if app.config['METRICS_ENABLED']:
+        import metrics
+        
+        # Time pool checkouts unless the database needs a special pool (in-memory SQLite)
+        engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        if 'poolclass' not in engine_options and metrics.uses_queue_pool(app.config['SQLALCHEMY_DATABASE_URI']):
+            engine_options['poolclass'] = metrics.TimedQueuePool
+        
+        metrics.init_app(app)
+        metrics.registry.register_cache('token', token_cache)
+        metrics.registry.register_cache('requisition_fragments', fragment_cache)
     
-    # Create all tables
-    db.create_all()
-    
-    # Create counters table if it doesn't exist
-    from models import Counter
-    if not Counter.query.filter_by(name='it_requisition').first():
-        db.session.add(Counter(name='it_requisition', value=0))
-    if not Counter.query.filter_by(name='conference_room').first():
-        db.session.add(Counter(name='conference_room', value=0))
-    if not Counter.query.filter_by(name='leave_request').first():
-        db.session.add(Counter(name='leave_request', value=0))
-    db.session.commit()
+    # Initialize the app with extensions
+    limiter.init_app(app)
+    db.init_app(app)
+
+    # Serve static files, from the fingerprinted build (`flask build-assets`) when there is one
+    from assets import asset_cache
+
+    @app.route('/')
+    def serve_index():
+        return asset_cache.response('index.html') or send_from_directory(app.static_folder, 'index.html')
+
+    @app.route('/<path:path>')
+    def serve_static(path):
+        return asset_cache.response(path) or send_from_directory(app.static_folder, path)
+
+    register_blueprints(app)
+    register_commands(app)
+
+    # Optional in-process token sweeper
+    if app.config['TOKEN_SWEEP_INTERVAL'] > 0:
+        import sweeper
+        sweeper.start_background_sweeper(app, app.config['TOKEN_SWEEP_INTERVAL'])
+
+    return app
 
 if __name__ == '__main__':
+    import migrations
+
+    app = create_app()
+    with app.app_context():
+        migrations.init_db()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,245 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import threading
+
+import click
+from flask import current_app, request
+from flask.cli import with_appcontext
+
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+# Text types worth storing a gzip variant of
+COMPRESSIBLE = {'.html', '.js', '.css', '.svg', '.json', '.txt', '.map'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# HTML keeps its name, so browsers revalidate it (cheaply, by ETag) on every visit
+HTML_CACHE_CONTROL = 'no-cache'
+
+# src="..." / href="..." attribute values in HTML
+REFERENCE_PATTERN = re.compile(r'''(\b(?:src|href)\s*=\s*)(["'])([^"'#?]+)([^"']*)\2''', re.IGNORECASE)
+
+def fingerprinted_name(path, data):
+    """js/api.js -> js/api.<content hash>.js"""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{extension}"
+
+def _compress(data):
+    # mtime=0 keeps the output identical between builds of the same content
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _write_with_gzip(build_dir, path, data):
+    """Write a built file, plus path.gz when compressing pays off; returns the gzip size or None"""
+    _write(os.path.join(build_dir, path), data)
+    if os.path.splitext(path)[1] not in COMPRESSIBLE:
+        return None
+    compressed = _compress(data)
+    if len(compressed) >= len(data):
+        return None
+    _write(os.path.join(build_dir, path + '.gz'), compressed)
+    return len(compressed)
+
+def rewrite_references(html, html_path, assets):
+    """Point local src/href attributes of an HTML document at fingerprinted names"""
+    base = os.path.dirname(html_path)
+
+    def replace(match):
+        prefix, quote, target, suffix = match.groups()
+        if '//' in target or target.startswith(('data:', 'mailto:', 'javascript:')):
+            return match.group(0)
+        absolute = target.startswith('/')
+        logical = target[1:] if absolute else os.path.normpath(os.path.join(base, target)).replace(os.sep, '/')
+        entry = assets.get(logical)
+        if entry is None:
+            return match.group(0)
+        if absolute:
+            hashed = '/' + entry['path']
+        else:
+            hashed = os.path.relpath(entry['path'], base or '.').replace(os.sep, '/')
+        return f"{prefix}{quote}{hashed}{suffix}{quote}"
+
+    return REFERENCE_PATTERN.sub(replace, html)
+
+def build_assets(source_dir, build_dir):
+    """Fingerprint and precompress everything under source_dir into build_dir.
+
+    Every non-HTML file is written under a content-hashed name, HTML keeps its
+    name with references rewritten to the hashed names, and a gzip variant is
+    stored next to each text file it shrinks. The manifest maps logical paths
+    to what was built. The build directory is replaced as a whole.
+    """
+    sources = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if not name.startswith('.'):
+                path = os.path.relpath(os.path.join(root, name), source_dir).replace(os.sep, '/')
+                sources.append(path)
+
+    staging = build_dir + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    assets, documents = {}, {}
+    for path in sources:
+        with open(os.path.join(source_dir, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.html'):
+            documents[path] = data
+            continue
+        hashed = fingerprinted_name(path, data)
+        assets[path] = {
+            'path': hashed,
+            'size': len(data),
+            'gzip_size': _write_with_gzip(staging, hashed, data)
+        }
+
+    html = {}
+    for path, data in documents.items():
+        rewritten = rewrite_references(data.decode('utf-8'), path, assets).encode('utf-8')
+        html[path] = {
+            'path': path,
+            'size': len(rewritten),
+            'gzip_size': _write_with_gzip(staging, path, rewritten),
+            'etag': hashlib.sha256(rewritten).hexdigest()[:HASH_LENGTH]
+        }
+
+    manifest = {'version': 1, 'assets': assets, 'html': html}
+    _write(os.path.join(staging, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.replace(staging, build_dir)
+    return manifest
+
+class _Asset:
+    __slots__ = ('body', 'gzip_body', 'mimetype', 'cache_control', 'etag')
+
+    def __init__(self, body, gzip_body, mimetype, cache_control, etag):
+        self.body = body
+        self.gzip_body = gzip_body
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = etag
+
+class AssetCache:
+    """Built assets held in memory and served with the encoding the client accepts.
+
+    Loaded from ASSET_BUILD_DIR on first use in each process; without a build
+    (e.g. in development) it stays empty and the caller falls back to
+    serving files from the static folder. Rebuilds are picked up on restart.
+    """
+
+    def __init__(self):
+        self._assets = None
+        self._lock = threading.Lock()
+
+    def load(self, build_dir):
+        """Read the build into memory, replacing whatever was loaded before"""
+        assets = {}
+        manifest_path = os.path.join(build_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            for section, cache_control in (('assets', IMMUTABLE_CACHE_CONTROL), ('html', HTML_CACHE_CONTROL)):
+                for entry in manifest[section].values():
+                    path = entry['path']
+                    with open(os.path.join(build_dir, path), 'rb') as f:
+                        body = f.read()
+                    gzip_body = None
+                    if entry['gzip_size']:
+                        with open(os.path.join(build_dir, path + '.gz'), 'rb') as f:
+                            gzip_body = f.read()
+                    assets[path] = _Asset(
+                        body, gzip_body,
+                        mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                        cache_control, entry.get('etag')
+                    )
+        self._assets = assets
+        return len(assets)
+
+    def get(self, path):
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    self.load(current_app.config['ASSET_BUILD_DIR'])
+        return self._assets.get(path)
+
+    def response(self, path):
+        """Response for a built asset, or None if path was not built"""
+        asset = self.get(path)
+        if asset is None:
+            return None
+
+        use_gzip = asset.gzip_body is not None and _accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        response = current_app.response_class(asset.gzip_body if use_gzip else asset.body, mimetype=asset.mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        if asset.gzip_body is not None:
+            response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = asset.cache_control
+        if asset.etag:
+            response.set_etag(asset.etag + ('-gz' if use_gzip else ''))
+            response = response.make_conditional(request)
+        return response
+
+def _accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows a gzip response.
+
+    An explicit gzip entry wins over "*"; a q value that does not parse
+    counts as 1, and parameters other than q are ignored.
+
+    >>> _accepts_gzip('gzip, deflate, br')
+    True
+    >>> _accepts_gzip('gzip;q=0.5;level=1')
+    True
+    >>> _accepts_gzip('gzip;q=abc')
+    True
+    >>> _accepts_gzip('gzip; q=0')
+    False
+    >>> _accepts_gzip('gzip;q=0, *')
+    False
+    >>> _accepts_gzip('br, *;q=0.1')
+    True
+    >>> _accepts_gzip('br, *;q=0')
+    False
+    >>> _accepts_gzip('')
+    False
+    """
+    wildcard = False
+    for part in accept_encoding.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if coding not in ('gzip', '*'):
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 1.0
+        if coding == 'gzip':
+            return quality > 0
+        wildcard = quality > 0
+    return wildcard
+
+asset_cache = AssetCache()
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Write fingerprinted, gzipped static assets and rewritten HTML to ASSET_BUILD_DIR"""
+    source_dir = current_app.static_folder
+    if not source_dir or not os.path.isdir(source_dir):
+        raise click.ClickException(f"Static folder {source_dir} does not exist")
+    manifest = build_assets(source_dir, current_app.config['ASSET_BUILD_DIR'])
+    raw = sum(entry['size'] for entry in manifest['assets'].values())
+    compressed = sum(entry['gzip_size'] or entry['size'] for entry in manifest['assets'].values())
+    click.echo(f"Built {len(manifest['assets'])} assets ({raw} bytes, {compressed} gzipped) "
+               f"and {len(manifest['html'])} HTML documents")
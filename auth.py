@@ -1,34 +1,135 @@
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
+import os
 from datetime import datetime, timedelta
 from functools import wraps
+import hashlib
 import json
+import time
+import uuid
 
-from app import db, limiter
-from models import User, Token
+from app import db, limiter, token_cache
+from models import User, Token, Counter, USERS_REVISION
+from revocation import RevocationList
+from passwords import (
+    PasswordPoolBusy, password_pool, hash_password, verify_password, needs_rehash
+)
+import search
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+TOKEN_LIFETIME = timedelta(hours=24)
+
+revocation_list = RevocationList(
+    refresh_interval=float(os.environ.get('JWT_DENYLIST_REFRESH', '30'))
+)
+
+def is_stateless_mode():
+    return current_app.config.get('JWT_STATELESS', False)
+
 def generate_jwt_token(user_id):
+    issued_at = datetime.utcnow()
     payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=24),
-        'iat': datetime.utcnow()
+        'jti': uuid.uuid4().hex,
+        'exp': issued_at + TOKEN_LIFETIME,
+        'iat': issued_at
     }
     token = jwt.encode(payload, current_app.secret_key, algorithm='HS256')
     
+    # Stateless tokens are verified from their signature alone
+    if is_stateless_mode():
+        return token
+    
     # Store token in database
     token_record = Token(
         user_id=user_id,
         token=token,
-        expires_at=datetime.utcnow() + timedelta(hours=24)
+        expires_at=issued_at + TOKEN_LIFETIME
     )
     db.session.add(token_record)
     db.session.commit()
     
     return token
 
+class AuthenticatedUser:
+    """Current user rebuilt from the token cache.
+
+    id, role and is_active come from the cache; any other attribute loads the
+    User row on first access, so views that only check identity and role
+    never touch the database.
+    """
+    __slots__ = ('id', 'role', 'is_active', '_user')
+    
+    def __init__(self, user_id, role, is_active):
+        object.__setattr__(self, 'id', user_id)
+        object.__setattr__(self, 'role', role)
+        object.__setattr__(self, 'is_active', is_active)
+        object.__setattr__(self, '_user', None)
+    
+    def _load(self):
+        if self._user is None:
+            object.__setattr__(self, '_user', db.session.get(User, self.id))
+        return self._user
+    
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def invalidate_token(token):
+    """Drop a single token from the validated-token cache"""
+    token_cache.pop(hash_token(token))
+
+def invalidate_user_tokens(user_id):
+    """Drop every cached token belonging to a user.
+
+    This worker forgets them at once; other workers revalidate them once their
+    revocation list next syncs, within JWT_DENYLIST_REFRESH seconds.
+    """
+    token_cache.discard_where(lambda entry: entry['user_id'] == user_id)
+    revocation_list.revoke(
+        RevocationList.refresh_key(user_id),
+        datetime.utcnow() + TOKEN_LIFETIME
+    )
+
+def revoke_user_tokens(user_id):
+    """Revoke every token issued to a user so far, e.g. on deactivation"""
+    invalidate_user_tokens(user_id)
+    if is_stateless_mode():
+        revocation_list.revoke(
+            RevocationList.user_key(user_id),
+            datetime.utcnow() + TOKEN_LIFETIME
+        )
+
+def _validate_stored_token(token):
+    """Validate a token against the tokens table, returning (claims, error)"""
+    token_record = Token.query.filter_by(token=token, is_valid=True).first()
+    if not token_record:
+        return None, 'Invalid token'
+    
+    # Check if token is expired
+    if token_record.expires_at < datetime.utcnow():
+        token_record.is_valid = False
+        db.session.commit()
+        return None, 'Token has expired'
+    
+    return jwt.decode(token, current_app.secret_key, algorithms=['HS256']), None
+
+def _validate_stateless_token(token):
+    """Validate a token from its signature, expiry and the revocation list, returning (claims, error)"""
+    data = jwt.decode(
+        token, current_app.secret_key, algorithms=['HS256'],
+        options={'require': ['exp', 'iat', 'jti']}
+    )
+    if revocation_list.is_revoked(data):
+        return None, 'Token has been revoked'
+    return data, None
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -44,20 +145,31 @@ def token_required(f):
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
         
+        stateless = is_stateless_mode()
+        token_hash = hash_token(token)
+        cached = token_cache.get(token_hash)
+        if cached is not None:
+            # Other workers may have logged the token out or changed the user since it was cached
+            if revocation_list.is_revoked(cached):
+                invalidate_token(token)
+                return jsonify({'error': 'Token has been revoked'}), 401
+            if revocation_list.is_stale(cached['user_id'], cached['validated_at']):
+                invalidate_token(token)
+                cached = None
+        if cached is not None:
+            current_user = AuthenticatedUser(cached['user_id'], cached['role'], cached['is_active'])
+            return f(current_user, *args, **kwargs)
+        
+        # Taken before reading the user, so a change committed meanwhile marks the entry stale
+        validated_at = time.time()
         try:
-            # Check if token exists and is valid in database
-            token_record = Token.query.filter_by(token=token, is_valid=True).first()
-            if not token_record:
-                return jsonify({'error': 'Invalid token'}), 401
-            
-            # Check if token is expired
-            if token_record.expires_at < datetime.utcnow():
-                token_record.is_valid = False
-                db.session.commit()
-                return jsonify({'error': 'Token has expired'}), 401
+            if stateless:
+                data, error = _validate_stateless_token(token)
+            else:
+                data, error = _validate_stored_token(token)
+            if error:
+                return jsonify({'error': error}), 401
             
-            # Decode JWT
-            data = jwt.decode(token, current_app.secret_key, algorithms=['HS256'])
             current_user = User.query.get(data['user_id'])
             
             if not current_user or not current_user.is_active:
@@ -68,6 +180,16 @@ def token_required(f):
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Invalid token'}), 401
         
+        # Cache the validated token, never beyond its own expiry
+        token_cache.set(token_hash, {
+            'user_id': current_user.id,
+            'role': current_user.role,
+            'is_active': current_user.is_active,
+            'jti': data.get('jti'),
+            'iat': data['iat'],
+            'validated_at': validated_at
+        }, ttl=data['exp'] - time.time())
+        
         return f(current_user, *args, **kwargs)
     
     return decorated
@@ -105,7 +227,7 @@ def register():
             return jsonify({'error': 'Email already exists'}), 400
         
         # Hash password
-        password_hash = generate_password_hash(data['password'])
+        password_hash = hash_password(data['password'])
         
         # Create user
         user = User(
@@ -119,7 +241,9 @@ def register():
         )
         
         db.session.add(user)
+        Counter.bump(USERS_REVISION)
         db.session.commit()
+        search.index_user(user)
         
         # Generate token
         token = generate_jwt_token(user.id)
@@ -149,12 +273,17 @@ def login():
             (User.username == data['login']) | (User.email == data['login'])
         ).first()
         
-        if not user or not check_password_hash(user.password_hash, data['password']):
+        if not user or not verify_password(user.password_hash, data['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
         
         if not user.is_active:
             return jsonify({'error': 'Account is deactivated'}), 401
         
+        # Upgrade hashes made with outdated parameters while the plaintext is at hand
+        if needs_rehash(user.password_hash):
+            user.password_hash = hash_password(data['password'])
+            db.session.commit()
+        
         # Generate token
         token = generate_jwt_token(user.id)
         
@@ -164,6 +293,8 @@ def login():
             'token': token
         }), 200
         
+    except PasswordPoolBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503
     except Exception as e:
         current_app.logger.error(f"Login error: {e}")
         return jsonify({'error': 'Login failed'}), 500
@@ -175,11 +306,18 @@ def logout(current_user):
         auth_header = request.headers.get('Authorization')
         if auth_header:
             token = auth_header.split(' ')[1]
-            # Invalidate token
-            token_record = Token.query.filter_by(token=token).first()
-            if token_record:
-                token_record.is_valid = False
-                db.session.commit()
+            data = jwt.decode(token, current_app.secret_key, algorithms=['HS256'])
+            if not is_stateless_mode():
+                # Invalidate token
+                token_record = Token.query.filter_by(token=token).first()
+                if token_record:
+                    token_record.is_valid = False
+            invalidate_token(token)
+            # Deny the token until it would have expired anyway; this also
+            # reaches workers that still hold it in their token cache
+            if data.get('jti'):
+                revocation_list.revoke(data['jti'], datetime.utcfromtimestamp(data['exp']))
+            db.session.commit()
         
         return jsonify({'message': 'Logged out successfully'}), 200
         
@@ -192,6 +330,18 @@ def logout(current_user):
 def get_current_user(current_user):
     return jsonify({'user': current_user.to_dict()}), 200
 
+@bp.route('/token-cache', methods=['GET'])
+@token_required
+@role_required('it')
+def get_token_cache_stats(current_user):
+    return jsonify({'token_cache': token_cache.stats()}), 200
+
+@bp.route('/password-pool', methods=['GET'])
+@token_required
+@role_required('it')
+def get_password_pool_stats(current_user):
+    return jsonify({'password_pool': password_pool.stats()}), 200
+
 @bp.route('/change-password', methods=['POST'])
 @token_required
 def change_password(current_user):
@@ -202,11 +352,11 @@ def change_password(current_user):
             return jsonify({'error': 'Current password and new password are required'}), 400
         
         # Verify current password
-        if not check_password_hash(current_user.password_hash, data['current_password']):
+        if not verify_password(current_user.password_hash, data['current_password']):
             return jsonify({'error': 'Current password is incorrect'}), 400
         
         # Update password
-        current_user.password_hash = generate_password_hash(data['new_password'])
+        current_user.password_hash = hash_password(data['new_password'])
         current_user.updated_at = datetime.utcnow()
         db.session.commit()
         
@@ -0,0 +1,307 @@
+"""Deterministic synthetic data for benchmarks.
+
+Fills an empty database with users, requisitions of all three types (with a
+realistic status mix and changelog events) and tokens. The same --seed and
+--anchor always produce the same rows, apart from token timestamps, which
+are relative to now so the tokens are valid. Usernames and roles follow from
+the row index (see username and role_of), so load tests can log in without
+reading the database. Every user's password is PASSWORD.
+
+    python -m benchmarks.datagen --users 10000 --requisitions 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+PASSWORD = 'benchmark-password'
+BATCH_ROWS = 5000
+
+FIRST_NAMES = ['Ali', 'Sara', 'Usman', 'Ayesha', 'Bilal', 'Fatima', 'Hamza', 'Zainab', 'Omar', 'Hira',
+               'Kamran', 'Nida', 'Faisal', 'Mariam', 'Imran', 'Sana', 'Tariq', 'Amna', 'Yasir', 'Iqra']
+LAST_NAMES = ['Khan', 'Ahmed', 'Malik', 'Hussain', 'Butt', 'Qureshi', 'Sheikh', 'Chaudhry', 'Siddiqui',
+              'Raza', 'Mirza', 'Javed', 'Iqbal', 'Aslam', 'Farooq', 'Nawaz', 'Rana', 'Abbasi', 'Zaidi', 'Alvi']
+DESIGNATIONS = ['Engineer', 'Senior Engineer', 'Analyst', 'Accountant', 'Draftsman', 'Project Manager',
+                'Administrator', 'Coordinator', 'Surveyor', 'Consultant']
+ROOMS = ['Conference Room A', 'Conference Room B', 'Meeting Room 1', 'Meeting Room 2', 'Board Room']
+IT_CATEGORIES = ['hardware', 'software', 'network', 'access', 'support']
+LEAVE_TYPES = ['annual', 'sick', 'casual', 'unpaid']
+PRIORITIES = ['low', 'medium', 'medium', 'high', 'urgent']
+
+TYPE_MIX = [('it', 0.5), ('conference_room', 0.2), ('leave', 0.3)]
+STATUS_MIX = {
+    'it': [('pending', 0.15), ('approved', 0.2), ('in_progress', 0.15), ('completed', 0.4), ('declined', 0.1)],
+    'conference_room': [('pending', 0.1), ('approved', 0.6), ('completed', 0.2), ('declined', 0.1)],
+    'leave': [('pending', 0.15), ('approved', 0.55), ('completed', 0.2), ('declined', 0.1)],
+}
+# Status changes that lead from pending to each final status
+STATUS_PATHS = {
+    'pending': [],
+    'approved': ['approved'],
+    'in_progress': ['approved', 'in_progress'],
+    'completed': ['approved', 'completed'],
+    'declined': ['declined'],
+}
+DISPLAY_PREFIXES = {'it': 'IT', 'conference_room': 'CR', 'leave': 'LR'}
+
+def username(index):
+    return f"user{index:06d}"
+
+def role_of(index):
+    """Roles by index: user 0 and every 50th user are IT, every 10th (offset 2) a manager"""
+    if index == 0 or index % 50 == 1:
+        return 'it'
+    if index % 10 == 2:
+        return 'manager'
+    return 'employee'
+
+def usernames_for_role(role, count, users):
+    """The first count usernames with the given role among users generated users"""
+    names = [username(i) for i in range(users) if role_of(i) == role]
+    return names[:count]
+
+def _pick(rng, weighted):
+    value = rng.random()
+    for item, weight in weighted:
+        value -= weight
+        if value < 0:
+            return item
+    return weighted[-1][0]
+
+def _weekdays(start, end):
+    """Monday to Friday days in the inclusive range; generated data has no holidays"""
+    def before(ordinal):
+        weeks, extra = divmod(ordinal - 1, 7)
+        return weeks * 5 + min(extra, 5)
+    return before(end.toordinal() + 1) - before(start.toordinal())
+
+def _insert(conn, table, rows):
+    if rows:
+        conn.execute(table.insert(), rows)
+
+def generate_users(conn, rng, count, anchor, password_hash):
+    from models import User
+    table = User.__table__
+    batch = []
+    for index in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        created = anchor - timedelta(days=rng.randrange(365 * 3), seconds=rng.randrange(86400))
+        batch.append({
+            'username': username(index),
+            'email': f"{username(index)}@bench.example",
+            'password_hash': password_hash,
+            'role': role_of(index),
+            'full_name': f"{first} {last}",
+            'designation': rng.choice(DESIGNATIONS),
+            'phone_extension': str(1000 + index % 9000),
+            'created_at': created,
+            'updated_at': created,
+            'is_active': rng.random() > 0.02,
+        })
+        if len(batch) == BATCH_ROWS:
+            _insert(conn, table, batch)
+            batch = []
+    _insert(conn, table, batch)
+
+def generate_requisitions(conn, rng, count, users, anchor, with_events=True):
+    """Insert count requisitions and their events; returns per-type counts"""
+    from models import Requisition, RequisitionEvent
+    requisitions, events = [], []
+    counts = {req_type: 0 for req_type, _ in TYPE_MIX}
+    room_slots = {room: 0 for room in ROOMS}
+    span = 730 * 86400
+    timeline_start = anchor - timedelta(days=730)
+
+    def flush():
+        _insert(conn, Requisition.__table__, requisitions)
+        _insert(conn, RequisitionEvent.__table__, events)
+        requisitions.clear()
+        events.clear()
+
+    for _ in range(count):
+        req_type = _pick(rng, TYPE_MIX)
+        status = _pick(rng, STATUS_MIX[req_type])
+        counts[req_type] += 1
+        user_index = rng.randrange(users)
+        created = timeline_start + timedelta(seconds=rng.randrange(span))
+        requisition_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+        row = {
+            'id': requisition_id,
+            'display_id': f"{DISPLAY_PREFIXES[req_type]}-{counts[req_type]:04d}",
+            'user_id': user_index + 1,
+            'replacement_user_id': None,
+            'requisition_type': req_type,
+            'status': status,
+            'changelog': '[]',
+            'subject': f"{req_type.replace('_', ' ').title()} request {counts[req_type]}",
+            'description': 'Generated for benchmarking',
+            'priority': rng.choice(PRIORITIES),
+            'created_at': created,
+            'it_category': None, 'assigned_to': None,
+            'room_name': None, 'start_datetime': None, 'end_datetime': None,
+            'attendees_count': None, 'equipment_needed': None,
+            'leave_type': None, 'start_date': None, 'end_date': None, 'total_days': None,
+            'replacement_name': None, 'replacement_confirmed': False, 'replacement_token': None,
+        }
+
+        if req_type == 'it':
+            row['it_category'] = rng.choice(IT_CATEGORIES)
+            if status in ('in_progress', 'completed'):
+                row['assigned_to'] = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        elif req_type == 'conference_room':
+            # Consecutive half-hour slots from 09:00 to 17:00 per room, so bookings never overlap
+            room = rng.choice(ROOMS)
+            slot = room_slots[room]
+            room_slots[room] += 1
+            day, half_hour = divmod(slot, 16)
+            start = datetime.combine(timeline_start.date(), datetime.min.time()) + timedelta(
+                days=day, hours=9, minutes=30 * half_hour
+            )
+            row.update({
+                'room_name': room,
+                'start_datetime': start,
+                'end_datetime': start + timedelta(minutes=30),
+                'attendees_count': rng.randrange(2, 20),
+                'equipment_needed': rng.choice([None, 'Projector', 'Video conferencing']),
+            })
+        else:
+            start = created.date() + timedelta(days=rng.randrange(1, 60))
+            end = start + timedelta(days=rng.randrange(0, 10))
+            row.update({
+                'leave_type': rng.choice(LEAVE_TYPES),
+                'start_date': start,
+                'end_date': end,
+                'total_days': _weekdays(start, end),
+            })
+            if rng.random() < 0.4:
+                replacement = rng.randrange(users)
+                if replacement != user_index:
+                    row['replacement_user_id'] = replacement + 1
+                    row['replacement_confirmed'] = status != 'pending' or rng.random() < 0.5
+                    if not row['replacement_confirmed']:
+                        row['replacement_token'] = uuid.UUID(int=rng.getrandbits(128)).hex
+
+        updated = created
+        if with_events:
+            events.append({
+                'requisition_id': requisition_id, 'timestamp': created, 'action': 'created',
+                'user': 'Generator', 'details': 'Requisition created',
+            })
+        previous = 'pending'
+        for step in STATUS_PATHS[status]:
+            updated = updated + timedelta(hours=rng.randrange(1, 72))
+            if with_events:
+                events.append({
+                    'requisition_id': requisition_id, 'timestamp': updated, 'action': 'status_changed',
+                    'user': 'Generator', 'details': f"Status changed from {previous} to {step}",
+                })
+            previous = step
+        row['updated_at'] = updated
+
+        requisitions.append(row)
+        if len(requisitions) >= BATCH_ROWS:
+            flush()
+    flush()
+    return counts
+
+def generate_tokens(conn, rng, users, per_user, secret_key):
+    """Valid, signed tokens for the first users, as login would have stored them"""
+    import jwt
+    from models import Token
+    issued = datetime.utcnow()
+    batch = []
+    for index in range(users):
+        for _ in range(per_user):
+            payload = {
+                'user_id': index + 1,
+                'jti': uuid.UUID(int=rng.getrandbits(128)).hex,
+                'exp': issued + timedelta(hours=24),
+                'iat': issued,
+            }
+            batch.append({
+                'user_id': index + 1,
+                'token': jwt.encode(payload, secret_key, algorithm='HS256'),
+                'issued_at': issued,
+                'expires_at': issued + timedelta(hours=24),
+                'is_valid': True,
+            })
+            if len(batch) == BATCH_ROWS:
+                _insert(conn, Token.__table__, batch)
+                batch = []
+    _insert(conn, Token.__table__, batch)
+
+def _set_counter(conn, name, value):
+    from models import Counter
+    table = Counter.__table__
+    if not conn.execute(table.update().where(table.c.name == name).values(value=value)).rowcount:
+        conn.execute(table.insert().values(name=name, value=value))
+
+def generate(users, requisitions, tokens_per_user=1, seed=42, anchor=date(2026, 1, 1), with_events=True):
+    """Populate the current app's (empty) database; returns what was generated and how long it took"""
+    import leave_balances
+    from flask import current_app
+    from app import db
+    from models import User, REQUISITIONS_REVISION, USERS_REVISION
+    from passwords import hash_method
+    from werkzeug.security import generate_password_hash
+
+    if db.session.query(User.id).first() is not None:
+        raise RuntimeError('datagen needs an empty database')
+
+    rng = random.Random(seed)
+    anchor = datetime.combine(anchor, datetime.min.time())
+    started = time.perf_counter()
+    password_hash = generate_password_hash(PASSWORD, method=hash_method())
+
+    with db.engine.begin() as conn:
+        generate_users(conn, rng, users, anchor, password_hash)
+    with db.engine.begin() as conn:
+        counts = generate_requisitions(conn, rng, requisitions, users, anchor, with_events)
+    with db.engine.begin() as conn:
+        generate_tokens(conn, rng, users, tokens_per_user, current_app.secret_key)
+        # Continue display IDs after the generated ones and invalidate cached listings
+        for req_type, count in counts.items():
+            _set_counter(conn, f"{req_type}_requisition", count)
+            _set_counter(conn, REQUISITIONS_REVISION.format(req_type), count)
+        _set_counter(conn, USERS_REVISION, users)
+
+    leave_balances.rebuild_balances()
+    return {
+        'users': users,
+        'requisitions': counts,
+        'tokens': users * tokens_per_user,
+        'elapsed_seconds': round(time.perf_counter() - started, 2),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requisitions', type=int, default=20000)
+    parser.add_argument('--tokens-per-user', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--anchor', type=date.fromisoformat, default=date(2026, 1, 1),
+                        help='Requisitions are spread over the two years before this date')
+    parser.add_argument('--no-events', action='store_true', help='Skip changelog events')
+    args = parser.parse_args(argv)
+
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        print(f"DATABASE_URL={os.environ['DATABASE_URL']}")
+
+    import migrations
+    from app import create_app
+    app = create_app({'TOKEN_SWEEP_INTERVAL': 0})
+    with app.app_context():
+        migrations.init_db()
+        result = generate(args.users, args.requisitions, args.tokens_per_user, args.seed, args.anchor,
+                          not args.no_events)
+    print(result)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
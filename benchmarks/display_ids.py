@@ -0,0 +1,92 @@
+"""Concurrency stress test for requisition display ID allocation.
+
+Runs the legacy read-increment-commit scheme and the current allocator from
+many threads against a scratch SQLite database, then reports duplicates,
+errors and throughput for each.
+
+    python -m benchmarks.display_ids --threads 8 --per-thread 250 --block-size 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter as Tally
+
+def legacy_get_next_value(db, Counter, counter_name):
+    """The original Counter.get_next_value, kept for comparison"""
+    counter = Counter.query.filter_by(name=counter_name).first()
+    if not counter:
+        counter = Counter(name=counter_name, value=0)
+        db.session.add(counter)
+    counter.value += 1
+    db.session.commit()
+    return counter.value
+
+def run(app, db, allocate, threads, per_thread):
+    values = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+    
+    def worker():
+        with app.app_context():
+            barrier.wait()
+            for _ in range(per_thread):
+                try:
+                    value = allocate()
+                    with lock:
+                        values.append(value)
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(e)
+            db.session.remove()
+    
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    duplicates = sum(count - 1 for count in Tally(values).values() if count > 1)
+    return {
+        'allocated': len(values),
+        'duplicates': duplicates,
+        'errors': len(errors),
+        'elapsed_seconds': round(elapsed, 3),
+        'per_second': round(len(values) / elapsed, 1) if elapsed else 0.0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--per-thread', type=int, default=250)
+    parser.add_argument('--block-size', type=int, default=1)
+    args = parser.parse_args(argv)
+    
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    
+    import migrations
+    from app import create_app, db
+    from models import Counter
+    app = create_app({'DISPLAY_ID_BLOCK_SIZE': args.block_size})
+    with app.app_context():
+        migrations.init_db()
+    
+    legacy = run(app, db, lambda: legacy_get_next_value(db, Counter, 'bench_legacy'),
+                 args.threads, args.per_thread)
+    current = run(app, db, lambda: Counter.get_next_value('bench_allocator'),
+                  args.threads, args.per_thread)
+    
+    for name, result in (('legacy', legacy), ('allocator', current)):
+        print(f"{name:>10}: {result}")
+    
+    return 1 if current['duplicates'] or current['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""Scenario load test with concurrent clients per role.
+
+Each client logs in as a generated user of its role (see benchmarks.datagen)
+and then runs that role's scenario mix for the duration of the test. Runs
+in-process through Flask test clients against DATABASE_URL, or over HTTP
+with --url. Latencies recorded during --warmup are dropped. SQL statements
+per request come from the /metrics histograms, scraped before and after the
+measured window; they cover every server worker when the server shares
+METRICS_DIR between them (gunicorn.conf.py does).
+
+    python -m benchmarks.datagen --users 10000 --requisitions 1000000
+    python -m benchmarks.loadtest --users 10000 --clients employee=8,manager=2,it=1 \\
+        --duration 60 --output run.json
+    python -m benchmarks.report compare baseline.json run.json
+
+The target must have the same --users as the generated data, and rate
+limiting off (RATELIMIT_ENABLED=false) when testing over HTTP.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+from benchmarks import report
+from benchmarks.datagen import FIRST_NAMES, IT_CATEGORIES, LEAVE_TYPES, PASSWORD, usernames_for_role
+
+REQUISITION_TYPES = ['it', 'conference_room', 'leave']
+
+# Scenario weights per role
+ROLE_SCENARIOS = {
+    'employee': [('list_requisitions', 6), ('create_requisition', 2), ('login', 1)],
+    'manager': [('list_requisitions', 4), ('dashboard_summary', 3), ('login', 1)],
+    'it': [('list_requisitions', 4), ('search_users', 3), ('dashboard_summary', 1), ('login', 1)],
+}
+# Endpoint label each scenario's requests carry in /metrics
+SCENARIO_ENDPOINTS = {
+    'login': 'auth.login',
+    'list_requisitions': 'api.get_requisitions',
+    'search_users': 'api.search_users',
+    'create_requisition': 'api.create_requisition',
+    'dashboard_summary': 'api.get_dashboard_summary',
+}
+
+class InProcessSession:
+    """One client's connection to an app in this process"""
+
+    def __init__(self, app, metrics_token=None):
+        self._client = app.test_client()
+        self._metrics_token = metrics_token
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self._client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+    def metrics(self):
+        headers = {'Authorization': f'Bearer {self._metrics_token}'} if self._metrics_token else {}
+        response = self._client.get('/metrics', headers=headers)
+        return response.get_data(as_text=True) if response.status_code == 200 else None
+
+class HttpSession:
+    """One client's connection to a running server"""
+
+    def __init__(self, base_url, metrics_token=None, timeout=30):
+        self._base_url = base_url.rstrip('/')
+        self._metrics_token = metrics_token
+        self._timeout = timeout
+
+    def _open(self, method, path, data=None, headers=None):
+        req = urllib.request.Request(self._base_url + path, data=data, headers=headers or {}, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self._timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        status, payload = self._open(method, path, data, headers)
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    def metrics(self):
+        headers = {'Authorization': f'Bearer {self._metrics_token}'} if self._metrics_token else {}
+        status, payload = self._open('GET', '/metrics', headers=headers)
+        return payload.decode() if status == 200 else None
+
+class Client:
+    """A logged-in user of one role, running scenarios against a session"""
+
+    def __init__(self, session, role, login, seed):
+        self.session = session
+        self.role = role
+        self.login_name = login
+        self.rng = random.Random(seed)
+        self.token = None
+
+    def login(self):
+        status, data = self.session.request('POST', '/api/auth/login', {'login': self.login_name, 'password': PASSWORD})
+        if status == 200:
+            self.token = data['token']
+        return status == 200
+
+    def list_requisitions(self):
+        req_type = self.rng.choice(REQUISITION_TYPES)
+        status, _ = self.session.request('GET', f'/api/requisitions?type={req_type}&limit=50', token=self.token)
+        return status == 200
+
+    def search_users(self):
+        query = self.rng.choice(FIRST_NAMES)[:self.rng.randrange(2, 5)]
+        status, _ = self.session.request('GET', f'/api/users/search?query={query}', token=self.token)
+        return status == 200
+
+    def create_requisition(self):
+        if self.rng.random() < 0.5:
+            body = {
+                'requisition_type': 'it',
+                'subject': 'Load test request',
+                'description': 'Created by benchmarks.loadtest',
+                'it_category': self.rng.choice(IT_CATEGORIES),
+                'priority': self.rng.choice(['low', 'medium', 'high']),
+            }
+        else:
+            start = date.today() + timedelta(days=self.rng.randrange(7, 180))
+            body = {
+                'requisition_type': 'leave',
+                'subject': 'Load test leave',
+                'leave_type': self.rng.choice(LEAVE_TYPES),
+                'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=self.rng.randrange(0, 10))).isoformat(),
+            }
+        status, _ = self.session.request('POST', '/api/requisitions', body, token=self.token)
+        return status == 201
+
+    def dashboard_summary(self):
+        status, _ = self.session.request('GET', '/api/dashboard/summary', token=self.token)
+        return status == 200
+
+    def next_scenario(self):
+        weighted = ROLE_SCENARIOS[self.role]
+        value = self.rng.uniform(0, sum(weight for _, weight in weighted))
+        for name, weight in weighted:
+            value -= weight
+            if value < 0:
+                return name
+        return weighted[-1][0]
+
+def parse_sql_statements(text):
+    """{endpoint: (sum, count)} of the SQL statements histogram in a /metrics scrape"""
+    totals = {}
+    if not text:
+        return totals
+    for part, value in (('sum', 0), ('count', 1)):
+        pattern = rf'^pes_http_request_sql_statements_{part}\{{endpoint="([^"]*)"\}} (\S+)$'
+        for endpoint, number in re.findall(pattern, text, re.MULTILINE):
+            entry = totals.setdefault(endpoint, [0.0, 0.0])
+            entry[value] = float(number)
+    return totals
+
+def sql_per_request(before, after):
+    """Average statements per request of each scenario between two scrapes"""
+    averages = {}
+    for scenario, endpoint in SCENARIO_ENDPOINTS.items():
+        end_sum, end_count = after.get(endpoint, (0.0, 0.0))
+        start_sum, start_count = before.get(endpoint, (0.0, 0.0))
+        if end_count > start_count:
+            averages[scenario] = round((end_sum - start_sum) / (end_count - start_count), 2)
+    return averages
+
+def parse_clients(spec):
+    """'employee=8,manager=2' -> {'employee': 8, 'manager': 2}"""
+    clients = {}
+    for part in spec.split(','):
+        role, _, count = part.partition('=')
+        if role not in ROLE_SCENARIOS or not count.isdigit():
+            raise argparse.ArgumentTypeError(f"Invalid client spec: {part}")
+        clients[role] = int(count)
+    return clients
+
+def run(new_session, clients, users, duration, warmup, seed=42):
+    """Run the load test, returning its summary (see benchmarks.report.summarize).
+
+    new_session is called once per client and must return an object with
+    request() and metrics() like InProcessSession.
+    """
+    workers = []
+    for role, count in sorted(clients.items()):
+        logins = usernames_for_role(role, count, users)
+        if len(logins) < count:
+            raise ValueError(f"Only {len(logins)} {role} users among {users}")
+        for login in logins:
+            workers.append(Client(new_session(), role, login, f"{seed}-{login}"))
+
+    samples = {}
+    samples_lock = threading.Lock()
+    stop = threading.Event()
+    window = {}
+    ready = threading.Barrier(len(workers) + 1)
+    failed_logins = []
+
+    def drive(client):
+        recorded = {}
+        if not client.login():
+            failed_logins.append(client.login_name)
+        ready.wait()
+        while not stop.is_set():
+            scenario = client.next_scenario()
+            started = time.perf_counter()
+            try:
+                ok = getattr(client, scenario)()
+            except Exception:
+                ok = False
+            finished = time.perf_counter()
+            if window.get('start', float('inf')) <= started < window.get('end', float('inf')):
+                recorded.setdefault(scenario, []).append((finished - started, ok))
+        with samples_lock:
+            for scenario, values in recorded.items():
+                samples.setdefault(scenario, []).extend(values)
+
+    threads = [threading.Thread(target=drive, args=(client,), daemon=True) for client in workers]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    if failed_logins:
+        stop.set()
+        raise RuntimeError(f"Login failed for {len(failed_logins)} clients, e.g. {failed_logins[0]}")
+
+    time.sleep(warmup)
+    scraper = new_session()
+    before = parse_sql_statements(scraper.metrics())
+    window['start'] = time.perf_counter()
+    time.sleep(duration)
+    window['end'] = time.perf_counter()
+    after = parse_sql_statements(scraper.metrics())
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return report.summarize(samples, window['end'] - window['start'], sql_per_request(before, after))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Base URL of a running server; in-process against DATABASE_URL if unset')
+    parser.add_argument('--users', type=int, default=1000, help='--users the data was generated with')
+    parser.add_argument('--clients', type=parse_clients, default='employee=8,manager=2,it=1')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--metrics-token', default=os.environ.get('METRICS_TOKEN'))
+    parser.add_argument('--output', help='Save the report as JSON here')
+    args = parser.parse_args(argv)
+
+    if args.url:
+        mode = 'http'
+        def new_session():
+            return HttpSession(args.url, args.metrics_token)
+    else:
+        if 'DATABASE_URL' not in os.environ:
+            parser.error('set DATABASE_URL to a database filled by benchmarks.datagen, or pass --url')
+        from app import create_app
+        mode = 'in-process'
+        app = create_app({'RATELIMIT_ENABLED': False, 'TOKEN_SWEEP_INTERVAL': 0, 'METRICS_ENABLED': True})
+        def new_session():
+            return InProcessSession(app, args.metrics_token)
+
+    summary = run(new_session, args.clients, args.users, args.duration, args.warmup, args.seed)
+    result = report.build_report(
+        summary, mode=mode, url=args.url, users=args.users, clients=args.clients,
+        duration=args.duration, warmup=args.warmup, seed=args.seed
+    )
+    print(report.format_report(result))
+    if args.output:
+        report.save(result, args.output)
+    return 1 if summary['total_errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Query-plan checks for the role-scoped requisition listings.
+
+Builds every listing query get_requisitions and get_pending_replacement_requests
+can issue (each role, each type filter, first and later keyset pages) plus the
+conference room conflict check, asks the database for its plan and fails if any
+of them reads requisitions with a full table scan. Runs against DATABASE_URL, or a scratch SQLite database if unset.
+
+    python -m benchmarks.query_plans
+    DATABASE_URL=postgresql://... python -m benchmarks.query_plans
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+ROLES = ('employee', 'manager', 'it')
+TYPES = (None, 'it', 'conference_room', 'leave')
+
+# Plan lines that read the requisitions table without an index
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'^SCAN requisitions(?! USING)'),
+    'postgresql': re.compile(r'Seq Scan on requisitions\b'),
+}
+
+def listing_queries():
+    """Yield (label, query) for every listing shape the API can run"""
+    import api
+    from auth import AuthenticatedUser
+    from models import Requisition
+    
+    after = {'t': datetime(2024, 1, 1).isoformat(), 'i': 'ffffffff-ffff-ffff-ffff-ffffffffffff'}
+    for role in ROLES:
+        user = AuthenticatedUser(1, role, True)
+        for req_type in TYPES:
+            query = Requisition.query
+            if req_type:
+                query = query.filter_by(requisition_type=req_type)
+            segments = api._requisition_listing_segments(user, query, req_type)
+            for index, (segment, sort_column) in enumerate(segments):
+                label = f"{role} type={req_type or 'any'} segment={index}"
+                yield f"{label} first page", api._segment_page_query(segment, sort_column, None, 51)
+                yield f"{label} next page", api._segment_page_query(segment, sort_column, after, 51)
+    
+    user = AuthenticatedUser(1, 'employee', True)
+    yield 'pending replacements', Requisition.with_user_columns(api._pending_replacement_query(user))
+    
+    import rooms
+    yield 'room conflict check', rooms.conflict_query(
+        'Board Room', datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 10), exclude_id='x'
+    ).limit(1)
+
+def explain(conn, query):
+    """Return the plan lines for a query on SQLite or PostgreSQL"""
+    compiled = query.statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        return [row[-1] for row in rows]
+    
+    rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", params).fetchall()
+    return [row[0].strip() for row in rows]
+
+def check_plans(conn):
+    """Return (label, plan) for every listing query that falls back to a full scan"""
+    pattern = FULL_SCAN_PATTERNS[conn.dialect.name]
+    if conn.dialect.name == 'postgresql':
+        # Small tables make sequential scans look cheap; ask whether an index can be used at all
+        conn.exec_driver_sql("SET enable_seqscan = off")
+    
+    failures = []
+    for label, query in listing_queries():
+        plan = explain(conn, query)
+        if any(pattern.search(line) for line in plan):
+            failures.append((label, plan))
+    return failures
+
+def main():
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'plans.db')
+    
+    import migrations
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        migrations.init_db()
+    with app.app_context(), db.engine.connect() as conn:
+        if conn.dialect.name not in FULL_SCAN_PATTERNS:
+            print(f"No plan checks for {conn.dialect.name}")
+            return 0
+        failures = check_plans(conn)
+    
+    for label, plan in failures:
+        print(f"FULL SCAN: {label}")
+        for line in plan:
+            print(f"    {line}")
+    print(f"{len(failures)} listing queries fall back to a full table scan")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Cross-process rate limit benchmark.
+
+Forks several processes that race to hit the same limit through a limits
+storage, then checks how many hits were allowed in total. With the shared
+mmap storage the total must equal the limit exactly; the per-process memory
+storage (the old default) allows the limit once per process. Also reports
+the cost of one hit.
+
+    python -m benchmarks.ratelimit --processes 4 --limit 500 --attempts 2000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import limits
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+def hammer(uri, limit, attempts, results):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    item = limits.parse(f"{limit} per minute")
+    allowed = 0
+    started = time.perf_counter()
+    for _ in range(attempts):
+        if limiter.hit(item, 'benchmark', 'shared-key'):
+            allowed += 1
+    results.put((allowed, (time.perf_counter() - started) / attempts))
+
+def run(uri, processes, limit, attempts):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=hammer, args=(uri, limit, attempts, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return sum(allowed for allowed, _ in outcomes), max(per_hit for _, per_hit in outcomes)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--attempts', type=int, default=2000, help='Hits tried by each process')
+    args = parser.parse_args(argv)
+
+    import ratelimit_storage  # noqa: F401 (registers mmap://)
+
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.bin')
+    failed = False
+    for name, uri in (('memory', 'memory://'), ('mmap', f'mmap://{path}')):
+        allowed, per_hit = run(uri, args.processes, args.limit, args.attempts)
+        exact = allowed == args.limit
+        print(f"{name:>6}: {allowed} of {args.processes * args.attempts} hits allowed "
+              f"(limit {args.limit}, {'exact' if exact else 'NOT exact'}), "
+              f"{per_hit * 1e6:.1f} us per hit")
+        if name == 'mmap' and not exact:
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Load test reports: latency percentiles, throughput and SQL per request.
+
+Reports are plain JSON so runs can be kept next to each other and compared:
+
+    python -m benchmarks.report show run.json
+    python -m benchmarks.report compare baseline.json run.json --threshold 0.1
+
+compare exits 1 when any scenario's p95 latency or SQL statements per
+request grew, or its throughput dropped, by more than the threshold (a
+fraction of the baseline), so it can gate a CI job.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+PERCENTILES = (50, 95, 99)
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(samples, elapsed, sql=None):
+    """Build the per-scenario section of a report.
+
+    samples maps scenario name to a list of (seconds, ok) tuples recorded over
+    elapsed seconds; sql maps scenario name to the average SQL statements per
+    request, where known.
+    """
+    scenarios = {}
+    for name, recorded in sorted(samples.items()):
+        latencies = sorted(seconds for seconds, _ in recorded)
+        errors = sum(1 for _, ok in recorded if not ok)
+        summary = {
+            'requests': len(recorded),
+            'errors': errors,
+            'error_rate': round(errors / len(recorded), 4) if recorded else 0.0,
+            'throughput_rps': round(len(recorded) / elapsed, 2) if elapsed else 0.0,
+        }
+        for pct in PERCENTILES:
+            value = percentile(latencies, pct)
+            summary[f'p{pct}_ms'] = round(value * 1000, 2) if value is not None else None
+        summary['sql_per_request'] = (sql or {}).get(name)
+        scenarios[name] = summary
+
+    total = sum(summary['requests'] for summary in scenarios.values())
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'total_requests': total,
+        'total_errors': sum(summary['errors'] for summary in scenarios.values()),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'scenarios': scenarios,
+    }
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def build_report(summary, **params):
+    """Attach run metadata (revision, time, parameters) to a summary"""
+    return {
+        'meta': {
+            'git_revision': git_revision(),
+            'created_at': datetime.utcnow().isoformat() + 'Z',
+            **params,
+        },
+        **summary,
+    }
+
+def save(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def format_report(report):
+    meta = report.get('meta', {})
+    lines = [
+        f"revision {meta.get('git_revision') or '?'}, mode {meta.get('mode', '?')}, "
+        f"{report['total_requests']} requests in {report['elapsed_seconds']}s "
+        f"({report['throughput_rps']} req/s, {report['total_errors']} errors)",
+        f"{'scenario':<22}{'requests':>9}{'errors':>8}{'req/s':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'sql/req':>9}",
+    ]
+    for name, s in report['scenarios'].items():
+        sql = '-' if s.get('sql_per_request') is None else f"{s['sql_per_request']:.1f}"
+        lines.append(
+            f"{name:<22}{s['requests']:>9}{s['errors']:>8}{s['throughput_rps']:>9}"
+            f"{_ms(s['p50_ms']):>9}{_ms(s['p95_ms']):>9}{_ms(s['p99_ms']):>9}{sql:>9}"
+        )
+    return '\n'.join(lines)
+
+def _ms(value):
+    return '-' if value is None else f"{value:.1f}"
+
+def compare(baseline, current, threshold=0.1):
+    """Return a list of regressions of current against baseline, as messages"""
+    regressions = []
+    for name, new in current['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if not old or not old['requests'] or not new['requests']:
+            continue
+        # (metric, whether bigger is worse)
+        for metric, higher_is_worse in (('p95_ms', True), ('sql_per_request', True), ('throughput_rps', False)):
+            before, after = old.get(metric), new.get(metric)
+            if before is None or after is None or before == 0:
+                continue
+            change = (after - before) / before
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append(f"{name}: {metric} {before} -> {after} ({change:+.0%})")
+        if new['error_rate'] > old['error_rate'] + threshold / 10:
+            regressions.append(f"{name}: error_rate {old['error_rate']} -> {new['error_rate']}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    show = commands.add_parser('show', help='Print a saved report')
+    show.add_argument('report')
+    diff = commands.add_parser('compare', help='Compare a report against a baseline')
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--threshold', type=float, default=0.1,
+                      help='Allowed relative change before it counts as a regression')
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        print(format_report(load(args.report)))
+        return 0
+
+    baseline, current = load(args.baseline), load(args.current)
+    print('baseline: ' + format_report(baseline))
+    print('current:  ' + format_report(current))
+    for key in ('mode', 'users', 'clients', 'duration'):
+        if baseline.get('meta', {}).get(key) != current.get('meta', {}).get(key):
+            print(f"warning: runs differ in {key}, throughput is not comparable")
+    regressions = compare(baseline, current, args.threshold)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print(f"no regressions beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Worker boot benchmark.
+
+Starts fresh interpreters that import main (what a gunicorn worker does),
+timing the import and counting database connections and statements made
+before the first request, then serves one login request. Fails if booting
+touched the database. Runs against DATABASE_URL, or a scratch SQLite
+database initialised with init-db if unset.
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = r'''
+import json, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+counts = {"connections": 0, "statements": 0}
+def on_connect(*args):
+    counts["connections"] += 1
+def on_execute(*args):
+    counts["statements"] += 1
+event.listen(Pool, "connect", on_connect)
+event.listen(Engine, "before_cursor_execute", on_execute)
+
+import main
+booted = time.perf_counter()
+boot_counts = dict(counts)
+
+from app import limiter
+limiter.enabled = False
+response = main.app.test_client().post(
+    "/api/auth/login", json={"login": "nobody", "password": "wrong"}
+)
+served = time.perf_counter()
+
+print(json.dumps({
+    "boot_seconds": booted - started,
+    "boot_connections": boot_counts["connections"],
+    "boot_statements": boot_counts["statements"],
+    "first_request_seconds": served - booted,
+    "first_request_status": response.status_code,
+    "first_request_statements": counts["statements"] - boot_counts["statements"],
+}))
+'''
+
+def probe(env, cwd):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE], env=env, cwd=cwd, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, TOKEN_SWEEP_INTERVAL='0')
+    if 'DATABASE_URL' not in env:
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+    subprocess.run(
+        [sys.executable, '-m', 'flask', '--app', 'main', 'init-db'],
+        env=env, cwd=root, capture_output=True, check=True
+    )
+
+    runs = [probe(env, root) for _ in range(args.runs)]
+    boot = [run['boot_seconds'] for run in runs]
+    first = [run['first_request_seconds'] for run in runs]
+    touched = [run for run in runs if run['boot_connections'] or run['boot_statements']]
+
+    print(f"worker boot: median {statistics.median(boot) * 1000:.1f} ms, max {max(boot) * 1000:.1f} ms")
+    print(f"first request: median {statistics.median(first) * 1000:.1f} ms, "
+          f"{runs[0]['first_request_statements']} statements")
+    print(f"DB round-trips before first request: "
+          f"{max(run['boot_connections'] for run in runs)} connections, "
+          f"{max(run['boot_statements'] for run in runs)} statements")
+
+    return 1 if touched else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
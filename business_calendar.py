@@ -0,0 +1,112 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from app import db
+from models import Requisition, RequisitionEvent, Holiday, Counter, HOLIDAYS_REVISION, REQUISITIONS_REVISION
+import leave_balances
+
+LEAVE_RECOMPUTE_BATCH = 1000
+
+def _weekdays_before(ordinal):
+    """Monday to Friday days from date.min up to, not including, the given ordinal"""
+    # Ordinal 1 (0001-01-01) is a Monday
+    weeks, extra = divmod(ordinal - 1, 7)
+    return weeks * 5 + min(extra, 5)
+
+class BusinessCalendar:
+    """Counts working days (Monday to Friday, less holidays) over inclusive date ranges.
+
+    Holidays are held in memory as sorted ordinals and reloaded when the
+    holidays revision counter moves, so every worker sees additions made by
+    the others. Each range costs two bisects and some arithmetic.
+    """
+
+    def __init__(self):
+        self._holidays = []  # sorted ordinals of holidays falling on weekdays
+        self._revision = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        revision = Counter.get_values([HOLIDAYS_REVISION])[0]
+        if revision == self._revision:
+            return
+
+        dates = sorted(row.date for row in db.session.query(Holiday.date).all())
+        holidays = [d.toordinal() for d in dates if d.weekday() < 5]
+        with self._lock:
+            self._holidays = holidays
+            self._revision = revision
+
+    def business_days(self, start, end):
+        return self.business_days_many([start], [end])[0]
+
+    def business_days_many(self, starts, ends):
+        """Working days in each inclusive [start, end] range, 0 where end precedes start"""
+        self._refresh()
+        with self._lock:
+            holidays = self._holidays
+
+        counts = []
+        for start, end in zip(starts, ends):
+            first, last = start.toordinal(), end.toordinal()
+            if last < first:
+                counts.append(0)
+                continue
+            weekdays = _weekdays_before(last + 1) - _weekdays_before(first)
+            counts.append(weekdays - (bisect_right(holidays, last) - bisect_left(holidays, first)))
+        return counts
+
+business_calendar = BusinessCalendar()
+
+def recompute_leave_totals(first_day, last_day, changed_by):
+    """Recompute total_days for leave requests overlapping [first_day, last_day].
+
+    Meant to run right after a holiday change is committed. Changed totals
+    are written with executemany batches, each with a changelog event, and
+    committed together with the matching leave balance adjustments. Returns
+    how many requisitions changed.
+    """
+    rows = db.session.query(
+        Requisition.id, Requisition.user_id, Requisition.leave_type, Requisition.status,
+        Requisition.start_date, Requisition.end_date, Requisition.total_days
+    ).filter(
+        Requisition.requisition_type == 'leave',
+        Requisition.start_date <= last_day,
+        Requisition.end_date >= first_day
+    ).all()
+    if not rows:
+        return 0
+
+    totals = business_calendar.business_days_many(
+        [row.start_date for row in rows], [row.end_date for row in rows]
+    )
+    now = datetime.utcnow()
+    changed = [(row, total) for row, total in zip(rows, totals) if row.total_days != total]
+
+    for offset in range(0, len(changed), LEAVE_RECOMPUTE_BATCH):
+        batch = changed[offset:offset + LEAVE_RECOMPUTE_BATCH]
+        db.session.execute(db.update(Requisition), [
+            {'id': row.id, 'total_days': total, 'updated_at': now} for row, total in batch
+        ])
+        db.session.execute(db.insert(RequisitionEvent), [
+            {
+                'requisition_id': row.id,
+                'timestamp': now,
+                'action': 'total_days_recalculated',
+                'user': changed_by,
+                'details': f"Total days recalculated from {row.total_days} to {total} after a holiday change"
+            }
+            for row, total in batch
+        ])
+
+    # Approved leave already booked in the ledger moves by the difference
+    for row, total in changed:
+        leave_balances.record_total_change(
+            row.user_id, row.start_date, row.leave_type, row.status, row.total_days, total
+        )
+
+    if changed:
+        Counter.bump(REQUISITIONS_REVISION.format('leave'))
+    db.session.commit()
+    return len(changed)
@@ -0,0 +1,230 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+
+from models import Counter, REQUISITIONS_REVISION
+
+class Subscription:
+    """One connected client: a bounded buffer of records waiting to be sent.
+
+    When the buffer fills up the subscription is marked overflowed and takes no
+    more records. The stream then ends after draining what it has, and the
+    client resumes with Last-Event-ID from the feed history.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.overflowed = False
+        self._records = deque()
+        self._ready = threading.Condition()
+
+    def offer(self, record):
+        with self._ready:
+            if self.overflowed:
+                return
+            if len(self._records) >= self.maxsize:
+                self.overflowed = True
+            else:
+                self._records.append(record)
+            self._ready.notify()
+
+    def take(self, timeout):
+        """Return buffered records, waiting up to timeout seconds for at least one"""
+        with self._ready:
+            if not self._records and not self.overflowed:
+                self._ready.wait(timeout)
+            records = list(self._records)
+            self._records.clear()
+            return records
+
+class ChangeFeed:
+    """In-process publish/subscribe of requisition changes for the SSE stream.
+
+    Every record gets an id of the form <boot>-<sequence>, where boot is
+    drawn afresh in each process, so workers forked from one master never
+    accept each other's ids. The most recent records are kept so a
+    reconnecting client can replay what it missed; if its Last-Event-ID is
+    from another process or has fallen out of the history, it is told to
+    reload instead. The number of open streams is capped per process, since
+    each one holds a worker thread.
+    """
+
+    def __init__(self, history=1000):
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._boot = secrets.token_hex(4)
+        self._sequence = 0
+        self._history.clear()
+        self._subscribers = set()
+        self._streams = 0
+
+    def _check_process(self):
+        # Called with the lock held; a forked child starts a feed of its own
+        if self._pid != os.getpid():
+            self._reset()
+
+    @property
+    def boot(self):
+        with self._lock:
+            self._check_process()
+            return self._boot
+
+    def publish(self, action, requisition, audience):
+        """Queue a change for every subscriber; audience holds the fields used for role scoping"""
+        with self._lock:
+            self._check_process()
+            self._sequence += 1
+            record = {
+                'sequence': self._sequence,
+                'id': f"{self._boot}-{self._sequence}",
+                'action': action,
+                'requisition': requisition,
+                'audience': audience
+            }
+            self._history.append(record)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            subscription.offer(record)
+
+    def open_stream(self, limit):
+        """Claim one of limit stream slots, returning False when all are taken"""
+        with self._lock:
+            self._check_process()
+            if self._streams >= limit:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self._streams = max(0, self._streams - 1)
+
+    def subscribe(self, last_event_id=None, maxsize=256):
+        """Register a subscription, returning it with the records to replay first.
+
+        Replay is None when last_event_id cannot be resumed from this feed.
+        """
+        subscription = Subscription(maxsize)
+        with self._lock:
+            self._check_process()
+            self._subscribers.add(subscription)
+            if not last_event_id:
+                return subscription, []
+
+            boot, _, sequence = last_event_id.partition('-')
+            if boot != self._boot or not sequence.isdigit():
+                return subscription, None
+            sequence = int(sequence)
+            oldest = self._history[0]['sequence'] if self._history else self._sequence + 1
+            if sequence < oldest - 1 or sequence > self._sequence:
+                return subscription, None
+            return subscription, [record for record in self._history if record['sequence'] > sequence]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+def audience_of(requisition):
+    """The fields role scoping needs, captured while the requisition is still loaded"""
+    return {
+        'requisition_type': requisition.requisition_type,
+        'user_id': requisition.user_id,
+        'replacement_user_id': requisition.replacement_user_id,
+        'replacement_confirmed': requisition.replacement_confirmed
+    }
+
+def can_see(user_id, role, audience):
+    """Mirror the requisition listing visibility rules for one change"""
+    if role == 'it':
+        return True
+    if role == 'manager':
+        if audience['user_id'] == user_id:
+            return False
+        if audience['requisition_type'] == 'leave':
+            return audience['replacement_confirmed'] or audience['replacement_user_id'] is None
+        return True
+    # Employees list only their own requisitions; replacement requests reach them separately
+    return audience['user_id'] == user_id
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+def publish_change(action, requisition):
+    """Publish a committed create or update of a requisition"""
+    feed.publish(action, requisition.to_dict(), audience_of(requisition))
+
+def deletion_notice(requisition):
+    """Capture what a 'deleted' change needs before the row is gone"""
+    return {
+        'id': requisition.id,
+        'display_id': requisition.display_id,
+        'requisition_type': requisition.requisition_type
+    }, audience_of(requisition)
+
+def stream_changes(user_id, role, last_event_id, revisions):
+    """Yield SSE frames for one subscriber until the stream times out or overflows.
+
+    revisions is a callable returning the current {requisition type: revision
+    counter}; it is polled on each heartbeat to spot writes from other workers,
+    which show up as revision bumps this process did not commit itself.
+    """
+    config = current_app.config
+    heartbeat = config.get('CHANGE_FEED_HEARTBEAT', 15)
+    lifetime = config.get('CHANGE_FEED_MAX_SECONDS', 300)
+    subscription, replay = feed.subscribe(last_event_id, config.get('CHANGE_FEED_BUFFER', 256))
+
+    def baseline():
+        return {
+            req_type: (revision, Counter.committed_bumps(REQUISITIONS_REVISION.format(req_type)))
+            for req_type, revision in revisions().items()
+        }
+
+    try:
+        yield "retry: 3000\n\n"
+        if replay is None:
+            yield format_event('reset', {'reason': 'history unavailable'})
+            replay = []
+        for record in replay:
+            if can_see(user_id, role, record['audience']):
+                yield format_event(record['action'], record['requisition'], record['id'])
+
+        known = baseline()
+        deadline = time.monotonic() + lifetime
+        next_heartbeat = time.monotonic() + heartbeat
+        while time.monotonic() < deadline:
+            for record in subscription.take(max(0.0, next_heartbeat - time.monotonic())):
+                if can_see(user_id, role, record['audience']):
+                    yield format_event(record['action'], record['requisition'], record['id'])
+            if subscription.overflowed:
+                break
+
+            if time.monotonic() >= next_heartbeat:
+                yield ': heartbeat\n\n'
+                current = baseline()
+                for req_type, (revision, local) in current.items():
+                    known_revision, known_local = known.get(req_type, (revision, local))
+                    # More revisions than this process bumped means another worker wrote
+                    if revision - known_revision > local - known_local:
+                        yield format_event('resync', {'requisition_type': req_type})
+                known = current
+                next_heartbeat = time.monotonic() + heartbeat
+    finally:
+        feed.unsubscribe(subscription)
+
+feed = ChangeFeed()
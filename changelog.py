@@ -0,0 +1,119 @@
+import json
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from app import db
+from models import Requisition, RequisitionEvent
+
+def _entry_timestamp(value, default):
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return default
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+def changelog_events(changelog, created_at):
+    """Convert one legacy changelog blob into requisition_events rows.
+
+    History is never dropped: a blob that is not valid JSON becomes a single
+    'legacy' event carrying the raw text, and entries that are not objects are
+    kept the same way. A missing or unparseable timestamp falls back to the
+    requisition's created_at.
+
+    >>> created = datetime(2024, 1, 1)
+    >>> changelog_events('[{"timestamp": "2024-01-02T03:04:05", "action": "created", "user": "alice"}]', created)
+    [{'timestamp': datetime.datetime(2024, 1, 2, 3, 4, 5), 'action': 'created', 'user': 'alice', 'details': None}]
+    >>> changelog_events('approved by bob', created)
+    [{'timestamp': datetime.datetime(2024, 1, 1, 0, 0), 'action': 'legacy', 'user': None, 'details': 'approved by bob'}]
+    >>> changelog_events('["approved", {"action": "updated", "timestamp": "yesterday"}]', created)
+    [{'timestamp': datetime.datetime(2024, 1, 1, 0, 0), 'action': 'legacy', 'user': None, 'details': '"approved"'}, {'timestamp': datetime.datetime(2024, 1, 1, 0, 0), 'action': 'updated', 'user': None, 'details': None}]
+    >>> changelog_events('{"action": "created"}', created)
+    [{'timestamp': datetime.datetime(2024, 1, 1, 0, 0), 'action': 'created', 'user': None, 'details': None}]
+    """
+    try:
+        entries = json.loads(changelog)
+    except ValueError:
+        return [{'timestamp': created_at, 'action': 'legacy', 'user': None, 'details': changelog}]
+    
+    if not isinstance(entries, list):
+        entries = [entries]
+    
+    events = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            events.append({'timestamp': created_at, 'action': 'legacy', 'user': None, 'details': json.dumps(entry)})
+            continue
+        action = entry.get('action')
+        events.append({
+            'timestamp': _entry_timestamp(entry.get('timestamp'), created_at),
+            'action': (action if isinstance(action, str) and action else 'updated')[:50],
+            'user': _text(entry.get('user')),
+            'details': _text(entry.get('details'))
+        })
+    return events
+
+def migrate_changelog_batch(conn, batch_size=500):
+    """Move one batch of legacy JSON changelog blobs into requisition_events.
+
+    The converted requisitions have their blobs reset to '[]' on the same
+    connection, so a batch is all-or-nothing within the caller's transaction.
+    Returns (requisitions migrated, events written); (0, 0) once none are left.
+    """
+    table = Requisition.__table__
+    batch = conn.execute(
+        db.select(table.c.id, table.c.changelog, table.c.created_at).where(
+            table.c.changelog.isnot(None),
+            table.c.changelog != '[]',
+            table.c.changelog != ''
+        ).limit(batch_size)
+    ).all()
+    if not batch:
+        return 0, 0
+    
+    rows = []
+    for requisition_id, changelog, created_at in batch:
+        for event in changelog_events(changelog, created_at):
+            event['requisition_id'] = requisition_id
+            rows.append(event)
+    
+    if rows:
+        conn.execute(RequisitionEvent.__table__.insert(), rows)
+    conn.execute(
+        table.update().where(table.c.id.in_([row.id for row in batch])).values(changelog='[]')
+    )
+    return len(batch), len(rows)
+
+def migrate_changelog_blobs(batch_size=500):
+    """Move legacy JSON changelog blobs into requisition_events.
+
+    Each batch is converted in its own transaction, so the migration can be
+    interrupted and re-run safely. Returns (requisitions migrated, events written).
+    """
+    migrated = 0
+    events_written = 0
+    
+    while True:
+        with db.engine.begin() as conn:
+            batch_migrated, batch_events = migrate_changelog_batch(conn, batch_size)
+        if not batch_migrated:
+            break
+        migrated += batch_migrated
+        events_written += batch_events
+    
+    return migrated, events_written
+
+@click.command('migrate-changelogs')
+@click.option('--batch-size', default=500, show_default=True, help='Requisitions converted per transaction')
+@with_appcontext
+def migrate_changelogs_command(batch_size):
+    """Move JSON changelog blobs into the requisition_events table (also run by migration 8)"""
+    migrated, events_written = migrate_changelog_blobs(batch_size=batch_size)
+    click.echo(f"Migrated {migrated} requisitions ({events_written} events)")
@@ -30,6 +30,16 @@ async function initializeDashboard() {
         await loadDashboardData();
         await loadPendingReplacements();
         
+        // Refresh the summary when requisitions change, coalescing bursts
+        let refreshTimer = null;
+        subscribeToRequisitionChanges(() => {
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(() => {
+                loadDashboardData();
+                loadPendingReplacements();
+            }, 1000);
+        });
+        
     } catch (error) {
         console.error('Dashboard initialization error:', error);
         showAlert('Failed to initialize dashboard', 'danger');
@@ -95,23 +105,15 @@ async function loadDashboardData() {
     try {
         showLoading('recentActivityContainer', 'Loading dashboard data...');
         
-        // Load user's requisitions for stats
-        const [itResponse, conferenceResponse, leaveResponse] = await Promise.all([
-            api.get('/requisitions?type=it'),
-            api.get('/requisitions?type=conference_room'),
-            api.get('/requisitions?type=leave')
-        ]);
-        
-        const itRequisitions = itResponse.data.requisitions || [];
-        const conferenceRequisitions = conferenceResponse.data.requisitions || [];
-        const leaveRequisitions = leaveResponse.data.requisitions || [];
+        // Counts and recent items are aggregated on the server for the user's role
+        const response = await api.get('/dashboard/summary', { params: { recent: 10 } });
+        const summary = response.data;
         
         // Update stats
-        updateDashboardStats(itRequisitions, conferenceRequisitions, leaveRequisitions);
+        updateDashboardStats(summary);
         
         // Load recent activity
-        const allRequisitions = [...itRequisitions, ...conferenceRequisitions, ...leaveRequisitions];
-        updateRecentActivity(allRequisitions);
+        updateRecentActivity(summary.recent || []);
         
     } catch (error) {
         console.error('Error loading dashboard data:', error);
@@ -120,31 +122,16 @@ async function loadDashboardData() {
 }
 
 // Update dashboard statistics
-function updateDashboardStats(itRequisitions, conferenceRequisitions, leaveRequisitions) {
-    // Filter based on user role
-    let userItRequisitions = itRequisitions;
-    let userConferenceRequisitions = conferenceRequisitions;
-    let userLeaveRequisitions = leaveRequisitions;
-    
-    if (currentUser.role === 'employee') {
-        userItRequisitions = itRequisitions.filter(req => req.user_id === currentUser.id);
-        userConferenceRequisitions = conferenceRequisitions.filter(req => req.user_id === currentUser.id);
-        userLeaveRequisitions = leaveRequisitions.filter(req => req.user_id === currentUser.id);
-    }
+function updateDashboardStats(summary) {
+    const counts = summary.counts || {};
     
     // Update counts
-    document.getElementById('itRequestsCount').textContent = userItRequisitions.length;
-    document.getElementById('conferenceRequestsCount').textContent = userConferenceRequisitions.length;
-    document.getElementById('leaveRequestsCount').textContent = userLeaveRequisitions.length;
-    
-    // Count pending approvals for managers/IT
-    let pendingApprovals = 0;
-    if (currentUser.role === 'manager' || currentUser.role === 'it') {
-        pendingApprovals = [...itRequisitions, ...conferenceRequisitions, ...leaveRequisitions]
-            .filter(req => req.status === 'pending').length;
-    }
+    document.getElementById('itRequestsCount').textContent = counts.it ? counts.it.total : 0;
+    document.getElementById('conferenceRequestsCount').textContent = counts.conference_room ? counts.conference_room.total : 0;
+    document.getElementById('leaveRequestsCount').textContent = counts.leave ? counts.leave.total : 0;
     
-    document.getElementById('pendingApprovalsCount').textContent = pendingApprovals;
+    // Pending approvals are only counted for managers/IT
+    document.getElementById('pendingApprovalsCount').textContent = summary.pending_approvals || 0;
 }
 
 // Update recent activity
@@ -0,0 +1,65 @@
+import os
+
+# Threaded workers are required. A request waiting on the password pool
+# (passwords.py) only frees its worker for other requests if the worker has
+# other threads to serve them; a sync worker would block outright. Change
+# feed streams hold a thread each for up to CHANGE_FEED_MAX_SECONDS; at most
+# CHANGE_FEED_MAX_STREAMS (default 4) run per worker, so the remaining
+# threads stay free for the API. /api/stream/requisitions refuses to run on
+# a sync worker at all.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+# gthread workers heartbeat from their main loop, so a long-lived stream is
+# not mistaken for a hung worker; this only has to outlast ordinary requests
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+
+def on_starting(server):
+    """Create tables and apply migrations once in the master, before any worker boots.
+
+    Workers then start without touching the database. Set INIT_DB_ON_START=false
+    when a deploy step runs `flask --app main init-db` instead. Also gives the
+    workers a fresh METRICS_DIR, so /metrics reports all of them.
+    """
+    import shutil
+    import tempfile
+
+    metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "pes-metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    if os.environ.get("INIT_DB_ON_START", "true").lower() != "true":
+        return
+
+    import migrations
+    from app import create_app, db
+
+    app = create_app({"TOKEN_SWEEP_INTERVAL": 0})
+    with app.app_context():
+        applied = migrations.init_db()
+        # Do not let forked workers inherit the master's connections
+        db.engine.dispose()
+    server.log.info(f"Database ready ({len(applied)} migrations applied)")
+
+def when_ready(server):
+    """Fingerprint and precompress static assets once, before workers load them.
+
+    Set BUILD_ASSETS_ON_START=false when a deploy step runs
+    `flask --app main build-assets` instead.
+    """
+    if os.environ.get("BUILD_ASSETS_ON_START", "true").lower() != "true":
+        return
+
+    import assets
+    from app import create_app
+
+    app = create_app({"TOKEN_SWEEP_INTERVAL": 0})
+    if not os.path.isdir(app.static_folder):
+        server.log.warning(f"Static folder {app.static_folder} not found, serving unbuilt assets")
+        return
+    manifest = assets.build_assets(app.static_folder, app.config["ASSET_BUILD_DIR"])
+    server.log.info(f"Built {len(manifest['assets'])} static assets")
+
+def worker_exit(server, worker):
+    """Write the exiting worker's last metrics, so its counts stay in /metrics"""
+    import metrics
+
+    metrics.registry.flush(force=True)
@@ -0,0 +1,155 @@
+import click
+from flask.cli import with_appcontext
+
+from app import db
+from models import Requisition, LeaveBalance, increment_row
+
+# Statuses in which a leave request counts against the employee's balance
+COUNTED_STATUSES = ('approved', 'in_progress', 'completed')
+
+# Bucket for leave requests submitted without a leave type
+UNSPECIFIED_LEAVE_TYPE = 'other'
+
+def balance_key(user_id, start_date, leave_type):
+    """Ledger key for a leave request; a request counts towards the year it starts in"""
+    return user_id, start_date.year, leave_type or UNSPECIFIED_LEAVE_TYPE
+
+def apply_delta(user_id, year, leave_type, days, requests):
+    """Adjust one ledger row as part of the caller's transaction, creating it on first use"""
+    increment_row(
+        LeaveBalance.__table__,
+        {'user_id': user_id, 'year': year, 'leave_type': leave_type},
+        {'days_taken': days, 'requests': requests},
+        {'updated_at': db.func.now()}
+    )
+
+def status_delta(requisition, old_status, new_status):
+    """(ledger key, days, requests) moved by a status change, or None if the ledger is unaffected"""
+    if requisition.requisition_type != 'leave' or not requisition.start_date:
+        return None
+
+    was_counted = old_status in COUNTED_STATUSES
+    is_counted = new_status in COUNTED_STATUSES
+    if was_counted == is_counted:
+        return None
+
+    sign = 1 if is_counted else -1
+    key = balance_key(requisition.user_id, requisition.start_date, requisition.leave_type)
+    return key, sign * (requisition.total_days or 0), sign
+
+def record_status_change(requisition, old_status):
+    """Book or release a leave request's days when it enters or leaves a counted status"""
+    delta = status_delta(requisition, old_status, requisition.status)
+    if delta:
+        key, days, requests = delta
+        apply_delta(*key, days, requests)
+
+def record_status_changes(changes):
+    """Ledger effect of many (requisition, old status, new status) changes, one update per ledger row"""
+    totals = {}
+    for requisition, old_status, new_status in changes:
+        delta = status_delta(requisition, old_status, new_status)
+        if delta:
+            key, days, requests = delta
+            total = totals.setdefault(key, [0, 0])
+            total[0] += days
+            total[1] += requests
+    for key, (days, requests) in totals.items():
+        if days or requests:
+            apply_delta(*key, days, requests)
+
+def record_deletion(requisition):
+    """Release the days of a counted leave request that is being deleted"""
+    if requisition.requisition_type == 'leave' and requisition.start_date and requisition.status in COUNTED_STATUSES:
+        apply_delta(
+            *balance_key(requisition.user_id, requisition.start_date, requisition.leave_type),
+            -(requisition.total_days or 0), -1
+        )
+
+def record_total_change(user_id, start_date, leave_type, status, old_total, new_total):
+    """Carry a recalculated total_days of a counted leave request into the ledger"""
+    if status in COUNTED_STATUSES and start_date and old_total != new_total:
+        apply_delta(*balance_key(user_id, start_date, leave_type), (new_total or 0) - (old_total or 0), 0)
+
+def expected_balances():
+    """SELECT of the ledger rows as derived from the requisitions table"""
+    year = db.extract('year', Requisition.start_date)
+    leave_type = db.func.coalesce(Requisition.leave_type, UNSPECIFIED_LEAVE_TYPE)
+    return db.select(
+        Requisition.user_id,
+        db.cast(year, db.Integer).label('year'),
+        leave_type.label('leave_type'),
+        db.func.coalesce(db.func.sum(Requisition.total_days), 0).label('days_taken'),
+        db.func.count().label('requests')
+    ).filter(
+        Requisition.requisition_type == 'leave',
+        Requisition.status.in_(COUNTED_STATUSES),
+        Requisition.start_date.isnot(None)
+    ).group_by(Requisition.user_id, year, leave_type)
+
+def rebuild_balances():
+    """Replace the whole ledger with totals recomputed from requisitions in one transaction"""
+    rows = db.session.execute(expected_balances()).all()
+    LeaveBalance.query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(db.insert(LeaveBalance), [
+            {
+                'user_id': row.user_id,
+                'year': row.year,
+                'leave_type': row.leave_type,
+                'days_taken': row.days_taken,
+                'requests': row.requests
+            }
+            for row in rows
+        ])
+    db.session.commit()
+    return len(rows)
+
+def check_balances():
+    """Compare the ledger with requisitions, returning a list of mismatched rows"""
+    expected = {
+        (row.user_id, row.year, row.leave_type): (row.days_taken, row.requests)
+        for row in db.session.execute(expected_balances()).all()
+    }
+    actual = {
+        (row.user_id, row.year, row.leave_type): (row.days_taken, row.requests)
+        for row in db.session.query(
+            LeaveBalance.user_id, LeaveBalance.year, LeaveBalance.leave_type,
+            LeaveBalance.days_taken, LeaveBalance.requests
+        ).all()
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, (0, 0))
+        have = actual.get(key, (0, 0))
+        if want != have:
+            mismatches.append({
+                'user_id': key[0],
+                'year': key[1],
+                'leave_type': key[2],
+                'expected': {'days_taken': want[0], 'requests': want[1]},
+                'actual': {'days_taken': have[0], 'requests': have[1]}
+            })
+    return mismatches
+
+@click.command('rebuild-leave-balances')
+@with_appcontext
+def rebuild_leave_balances_command():
+    """Recompute the leave balance ledger from requisitions"""
+    count = rebuild_balances()
+    click.echo(f"Rebuilt {count} leave balance rows")
+
+@click.command('check-leave-balances')
+@with_appcontext
+def check_leave_balances_command():
+    """Report ledger rows that disagree with requisitions"""
+    mismatches = check_balances()
+    for mismatch in mismatches:
+        click.echo(
+            f"user {mismatch['user_id']} {mismatch['year']} {mismatch['leave_type']}: "
+            f"expected {mismatch['expected']}, ledger has {mismatch['actual']}"
+        )
+    if mismatches:
+        raise SystemExit(1)
+    click.echo("Leave balances are consistent")
@@ -1,4 +1,10 @@
-from app import app
+from app import create_app
+
+app = create_app()
 
 if __name__ == '__main__':
+    import migrations
+
+    with app.app_context():
+        migrations.init_db()
     app.run(host='0.0.0.0', port=5000, debug=True)
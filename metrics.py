@@ -0,0 +1,351 @@
+import fcntl
+import json
+import os
+import secrets
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from app import limiter
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+# Seconds between snapshots a worker writes to METRICS_DIR while serving requests
+FLUSH_INTERVAL = 1.0
+
+HISTOGRAMS = {
+    'pes_http_request_duration_seconds': ('Request duration by endpoint and status', DURATION_BUCKETS),
+    'pes_http_request_sql_statements': ('SQL statements executed per request', STATEMENT_BUCKETS),
+    'pes_http_request_sql_seconds': ('Time spent in SQL per request', DURATION_BUCKETS),
+    'pes_db_pool_checkout_wait_seconds': ('Time waiting to check a connection out of the pool', POOL_WAIT_BUCKETS),
+}
+
+class SharedMetricsDirectory:
+    """Metric snapshots of every worker on a host, one JSON file per process.
+
+    Selected with METRICS_DIR. Each worker rewrites its own file (atomically,
+    by rename) and a scrape, whichever worker answers it, adds up all of
+    them, so counters and histograms stay monotonic across workers. Files of
+    processes that have exited are folded into retired.json under a file
+    lock, the way exited threads are folded into the retired shard.
+    """
+
+    RETIRED = 'retired.json'
+
+    def __init__(self, path):
+        self.path = path
+        self._pid = None
+        self._file = None
+        os.makedirs(path, exist_ok=True)
+
+    def _own_file(self):
+        # A random suffix keeps a reused pid from overwriting an exited worker's counts
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file = os.path.join(self.path, f"{self._pid}-{secrets.token_hex(4)}.json")
+        return self._file
+
+    def write(self, histograms, caches):
+        path = self._own_file()
+        _write_json(path, {'pid': self._pid, 'histograms': _encode_series(histograms), 'caches': caches})
+
+    def collect(self):
+        """(histograms, cache stats) summed over every process that wrote here"""
+        with open(os.path.join(self.path, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired_path = os.path.join(self.path, self.RETIRED)
+            retired = _read_json(retired_path) or {'histograms': [], 'caches': {}}
+            retired_histograms = _decode_series(retired['histograms'])
+            retired_caches = retired['caches']
+            live_histograms, live_caches = {}, []
+            exited = []
+            for name in sorted(os.listdir(self.path)):
+                if not name.endswith('.json') or name == self.RETIRED:
+                    continue
+                data = _read_json(os.path.join(self.path, name))
+                if data is None:
+                    continue
+                histograms = _decode_series(data['histograms'])
+                if _is_running(data['pid']):
+                    MetricsRegistry._merge(live_histograms, histograms)
+                    live_caches.append(data['caches'])
+                else:
+                    MetricsRegistry._merge(retired_histograms, histograms)
+                    _add_cache_counts(retired_caches, data['caches'])
+                    exited.append(name)
+            if exited:
+                _write_json(retired_path, {
+                    'histograms': _encode_series(retired_histograms), 'caches': retired_caches
+                })
+                for name in exited:
+                    os.remove(os.path.join(self.path, name))
+
+        MetricsRegistry._merge(live_histograms, retired_histograms)
+        caches = {}
+        for name, stats in retired_caches.items():
+            caches[name] = {'hits': stats['hits'], 'misses': stats['misses'], 'size': 0}
+        for worker_caches in live_caches:
+            for name, stats in worker_caches.items():
+                total = caches.setdefault(name, {'hits': 0, 'misses': 0, 'size': 0})
+                for key in ('hits', 'misses', 'size'):
+                    total[key] += stats[key]
+        return live_histograms, caches
+
+def _encode_series(histograms):
+    return [[name, [list(pair) for pair in labels], series] for (name, labels), series in histograms.items()]
+
+def _decode_series(encoded):
+    return {(name, tuple(tuple(pair) for pair in labels)): series for name, labels, series in encoded}
+
+def _add_cache_counts(into, caches):
+    for name, stats in caches.items():
+        total = into.setdefault(name, {'hits': 0, 'misses': 0})
+        total['hits'] += stats['hits']
+        total['misses'] += stats['misses']
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path, data):
+    staging = f"{path}.{threading.get_ident()}.tmp"
+    with open(staging, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(staging, path)
+
+class MetricsRegistry:
+    """Histograms recorded into per-thread shards.
+
+    Each thread only ever writes to its own shard, so recording takes no lock;
+    the registry lock is taken once per thread to register the shard and on
+    each scrape. Shards of threads that have exited are folded into a single
+    retired shard at scrape time, which keeps per-request threads (as in the
+    development server) from piling up. Without METRICS_DIR a scrape only
+    covers the process that answered it; with several workers, set it (as
+    gunicorn.conf.py does) to report all of them.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []  # (weak ref to owning thread, shard)
+        self._retired = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._shared = None
+        self._flush_lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._flush_scheduled = False
+
+    def share(self, directory):
+        """Aggregate with the other processes writing snapshots to directory"""
+        self._shared = SharedMetricsDirectory(directory)
+
+    def flush(self, force=False):
+        """Write this process's snapshot for other workers' scrapes, at most once per FLUSH_INTERVAL unless forced"""
+        if self._shared is None:
+            return
+        if not force and time.monotonic() - self._flushed_at < FLUSH_INTERVAL:
+            # Write what was recorded once the interval is up, even if no request follows
+            with self._lock:
+                if self._flush_scheduled:
+                    return
+                self._flush_scheduled = True
+            timer = threading.Timer(FLUSH_INTERVAL, self._scheduled_flush)
+            timer.daemon = True
+            timer.start()
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._shared.write(self.snapshot(), self._cache_stats())
+            self._flushed_at = time.monotonic()
+        finally:
+            self._flush_lock.release()
+
+    def _scheduled_flush(self):
+        with self._lock:
+            self._flush_scheduled = False
+        self.flush(force=True)
+
+    def _cache_stats(self):
+        return {name: cache.stats() for name, cache in sorted(self._caches.items())}
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def observe(self, name, labels, value):
+        """Record value in the histogram name; labels is a tuple of (label, value) pairs"""
+        shard = self._shard()
+        series = shard.get((name, labels))
+        if series is None:
+            # bucket counts, then +Inf, then sum and count
+            series = shard[(name, labels)] = [0] * (len(HISTOGRAMS[name][1]) + 3)
+        series[bisect_left(HISTOGRAMS[name][1], value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def register_cache(self, name, cache):
+        """Export hit and miss counts of an object with a stats() method"""
+        self._caches[name] = cache
+
+    @staticmethod
+    def _merge(into, shard):
+        for key, series in list(shard.items()):
+            total = into.get(key)
+            if total is None:
+                into[key] = list(series)
+            else:
+                for i, value in enumerate(series):
+                    total[i] += value
+
+    def snapshot(self):
+        merged = {}
+        with self._lock:
+            live = []
+            for owner, shard in self._shards:
+                thread = owner()
+                if thread is None or not thread.is_alive():
+                    self._merge(self._retired, shard)
+                else:
+                    live.append((owner, shard))
+            self._shards = live
+            self._merge(merged, self._retired)
+            for _, shard in live:
+                self._merge(merged, shard)
+        return merged
+
+    def render(self):
+        """Prometheus text exposition of every histogram and registered cache"""
+        lines = []
+        if self._shared is not None:
+            self.flush(force=True)
+            histograms, cache_stats = self._shared.collect()
+            for stats in cache_stats.values():
+                lookups = stats['hits'] + stats['misses']
+                stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        else:
+            histograms, cache_stats = self.snapshot(), self._cache_stats()
+
+        series_by_name = {}
+        for (name, labels), series in histograms.items():
+            series_by_name.setdefault(name, []).append((labels, series))
+
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, series in sorted(series_by_name.get(name, [])):
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], series[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {series[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+
+        for metric, key, kind, help_text in (
+            ('pes_cache_hits_total', 'hits', 'counter', 'Cache lookups that found an entry'),
+            ('pes_cache_misses_total', 'misses', 'counter', 'Cache lookups that found nothing'),
+            ('pes_cache_hit_ratio', 'hit_rate', 'gauge', 'Share of cache lookups that hit'),
+            ('pes_cache_entries', 'size', 'gauge', 'Entries currently cached'),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in sorted(cache_stats.items()):
+                lines.append(f"{metric}{_labels((('cache', name),))} {stats[key]}")
+
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+registry = MetricsRegistry()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            registry.observe('pes_db_pool_checkout_wait_seconds', (), time.perf_counter() - started)
+
+def uses_queue_pool(database_uri):
+    """Whether SQLAlchemy would give this database a QueuePool by default"""
+    url = make_url(database_uri)
+    return not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'))
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not has_app_context() or 'metrics_sql' not in g:
+        return
+    g.metrics_sql[0] += 1
+    g.metrics_sql[1] += time.perf_counter() - getattr(context, '_metrics_started', time.perf_counter())
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = [0, 0.0]
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    statements, sql_seconds = g.pop('metrics_sql', (0, 0.0))
+    endpoint = request.endpoint or 'unmatched'
+    registry.observe(
+        'pes_http_request_duration_seconds',
+        (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))),
+        time.perf_counter() - started
+    )
+    registry.observe('pes_http_request_sql_statements', (('endpoint', endpoint),), statements)
+    registry.observe('pes_http_request_sql_seconds', (('endpoint', endpoint),), sql_seconds)
+    registry.flush()
+    return response
+
+@limiter.exempt
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    """Time every request and expose the registry on /metrics"""
+    if app.config.get('METRICS_DIR'):
+        registry.share(app.config['METRICS_DIR'])
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
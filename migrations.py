@@ -0,0 +1,254 @@
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import DBAPIError
+
+from app import db
+from models import Counter, LeaveBalance, Requisition, RequisitionEvent, SchemaMigration, Token, REQUISITION_TYPES, REQUISITIONS_REVISION, USERS_REVISION, HOLIDAYS_REVISION
+import changelog
+import leave_balances
+
+# (version, description, function) in the order they must be applied
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a schema migration; each one runs in its own transaction"""
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return f
+    return decorator
+
+def create_indexes(conn, model, *names):
+    """Create the named indexes declared on a model, skipping any that already exist"""
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+@migration(1, 'Token lookup and expiry indexes')
+def add_token_indexes(conn):
+    create_indexes(conn, Token, 'ix_tokens_token_is_valid', 'ix_tokens_expires_at')
+
+# Display ID prefix of each requisition type, as assigned by create_requisition
+DISPLAY_ID_PREFIXES = {'it': 'IT', 'conference_room': 'CR', 'leave': 'LR'}
+
+@migration(2, 'Unique requisition display IDs')
+def add_display_id_unique_index(conn):
+    table = Requisition.__table__
+    duplicates = conn.execute(
+        db.select(table.c.display_id)
+        .group_by(table.c.display_id)
+        .having(db.func.count() > 1)
+    ).scalars().all()
+    if duplicates:
+        renumber_duplicate_display_ids(conn, duplicates)
+    create_indexes(conn, Requisition, 'uq_requisitions_display_id')
+
+def renumber_duplicate_display_ids(conn, duplicates):
+    """Give every copy of a duplicated display ID but the oldest a fresh number from its type's counter.
+
+    New numbers are drawn past the counter and past any ID already in use,
+    the counters are advanced to match, and each renumbered requisition gets
+    an event recording its old ID.
+    """
+    table = Requisition.__table__
+    counters = Counter.__table__
+    rows = conn.execute(
+        db.select(table.c.id, table.c.display_id, table.c.requisition_type)
+        .where(table.c.display_id.in_(duplicates))
+        .order_by(table.c.display_id, table.c.created_at, table.c.id)
+    ).all()
+    used = set(conn.execute(db.select(table.c.display_id)).scalars())
+    
+    next_values = {}
+    seen = set()
+    events = []
+    now = datetime.utcnow()
+    for row in rows:
+        if row.display_id not in seen:
+            seen.add(row.display_id)
+            continue
+        
+        counter_name = f"{row.requisition_type}_requisition"
+        if counter_name not in next_values:
+            next_values[counter_name] = (conn.execute(
+                db.select(counters.c.value).where(counters.c.name == counter_name)
+            ).scalar() or 0) + 1
+        prefix = DISPLAY_ID_PREFIXES.get(row.requisition_type, row.requisition_type.upper())
+        while True:
+            display_id = f"{prefix}-{next_values[counter_name]:04d}"
+            next_values[counter_name] += 1
+            if display_id not in used:
+                break
+        used.add(display_id)
+        
+        conn.execute(table.update().where(table.c.id == row.id).values(display_id=display_id))
+        events.append({
+            'requisition_id': row.id,
+            'timestamp': now,
+            'action': 'renumbered',
+            'user': None,
+            'details': f"Display ID {row.display_id} was shared with another requisition; renumbered to {display_id}"
+        })
+        current_app.logger.warning(f"Renumbered duplicate display ID {row.display_id} of requisition {row.id} to {display_id}")
+    
+    conn.execute(RequisitionEvent.__table__.insert(), events)
+    for counter_name, next_value in next_values.items():
+        if not conn.execute(
+            counters.update().where(counters.c.name == counter_name).values(value=next_value - 1)
+        ).rowcount:
+            conn.execute(counters.insert().values(name=counter_name, value=next_value - 1))
+
+@migration(3, 'Role-scoped requisition listing indexes')
+def add_requisition_listing_indexes(conn):
+    create_indexes(
+        conn, Requisition,
+        'ix_requisitions_user_type_created',
+        'ix_requisitions_type_created',
+        'ix_requisitions_created',
+        'ix_requisitions_status_type_created',
+        'ix_requisitions_status_type_updated',
+        'ix_requisitions_replacement_pending'
+    )
+
+def seed_counters(conn, names):
+    """Insert a zero row for each counter in names that has none yet"""
+    table = Counter.__table__
+    existing = set(conn.execute(db.select(table.c.name).where(table.c.name.in_(names))).scalars())
+    missing = [{'name': name, 'value': 0} for name in names if name not in existing]
+    if missing:
+        conn.execute(table.insert(), missing)
+
+@migration(4, 'Seed listing revision counters')
+def seed_revision_counters(conn):
+    seed_counters(conn, [REQUISITIONS_REVISION.format(req_type) for req_type in REQUISITION_TYPES] + [USERS_REVISION])
+
+@migration(5, 'User search index')
+def add_user_search_index(conn):
+    if conn.dialect.name == 'sqlite':
+        # Without FTS5 the search falls back to the in-memory index
+        if not conn.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar():
+            return
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts "
+            "USING fts5(full_name, username, content='users', content_rowid='id')"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+            "INSERT INTO users_fts(rowid, full_name, username) VALUES (new.id, new.full_name, new.username); "
+            "END"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+            "INSERT INTO users_fts(users_fts, rowid, full_name, username) "
+            "VALUES ('delete', old.id, old.full_name, old.username); "
+            "END"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF full_name, username ON users BEGIN "
+            "INSERT INTO users_fts(users_fts, rowid, full_name, username) "
+            "VALUES ('delete', old.id, old.full_name, old.username); "
+            "INSERT INTO users_fts(rowid, full_name, username) VALUES (new.id, new.full_name, new.username); "
+            "END"
+        )
+        conn.exec_driver_sql("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+    
+    elif conn.dialect.name == 'postgresql':
+        try:
+            with conn.begin_nested():
+                conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DBAPIError as e:
+            current_app.logger.warning(f"pg_trgm unavailable, user search uses the in-memory index: {e}")
+            return
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_users_full_name_trgm ON users USING gin (full_name gin_trgm_ops)"
+        )
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)"
+        )
+
+@migration(6, 'Conference room schedule index')
+def add_room_schedule_index(conn):
+    create_indexes(conn, Requisition, 'ix_requisitions_room_schedule')
+
+@migration(7, 'Backfill leave balances')
+def backfill_leave_balances(conn):
+    rows = conn.execute(leave_balances.expected_balances()).mappings().all()
+    if rows:
+        conn.execute(LeaveBalance.__table__.insert(), [dict(row) for row in rows])
+
+@migration(8, 'Move legacy changelog blobs into requisition events')
+def migrate_legacy_changelogs(conn):
+    while changelog.migrate_changelog_batch(conn)[0]:
+        pass
+
+@migration(9, 'Seed every revision and display ID counter')
+def seed_all_counters(conn):
+    seed_counters(
+        conn,
+        [REQUISITIONS_REVISION.format(req_type) for req_type in REQUISITION_TYPES]
+        + [USERS_REVISION, HOLIDAYS_REVISION]
+        + [f"{req_type}_requisition" for req_type in REQUISITION_TYPES]
+    )
+
+def applied_versions(conn):
+    return set(conn.execute(db.select(SchemaMigration.__table__.c.version)).scalars())
+
+def upgrade(engine=None):
+    """Apply pending migrations in version order, returning the versions applied"""
+    engine = engine or db.engine
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+    
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            apply(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        current_app.logger.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+    
+    return applied
+
+# Counter rows the original schema seeded on every boot
+LEGACY_COUNTERS = ['it_requisition', 'conference_room', 'leave_request']
+
+def init_db():
+    """Create missing tables, apply pending migrations and seed counters, returning the versions applied"""
+    db.create_all()
+    applied = upgrade()
+    
+    table = Counter.__table__
+    with db.engine.begin() as conn:
+        existing = set(conn.execute(db.select(table.c.name).where(table.c.name.in_(LEGACY_COUNTERS))).scalars())
+        missing = [{'name': name, 'value': 0} for name in LEGACY_COUNTERS if name not in existing]
+        if missing:
+            conn.execute(table.insert(), missing)
+    
+    return applied
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create tables, apply migrations and seed counters; run once per deploy"""
+    applied = init_db()
+    click.echo(f"Database initialised ({len(applied)} migrations applied)")
+
+@click.command('migrate')
+@with_appcontext
+def migrate_command():
+    """Create missing tables and apply pending schema migrations"""
+    db.create_all()
+    applied = upgrade()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        click.echo("Database is up to date")
@@ -1,8 +1,23 @@
 from app import db
+from collections import Counter as TallyCounter
 from datetime import datetime
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+import threading
 import uuid
 import secrets
 
+REQUISITION_TYPES = ['it', 'conference_room', 'leave']
+
+# Counter names for the per-scope revisions behind list ETags
+REQUISITIONS_REVISION = 'revision:requisitions:{}'
+USERS_REVISION = 'revision:users'
+HOLIDAYS_REVISION = 'revision:holidays'
+# Bumped whenever cached sessions may no longer be valid (logout, role or activation changes)
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -39,6 +54,21 @@ class User(db.Model):
 
 class Requisition(db.Model):
     __tablename__ = 'requisitions'
+    __table_args__ = (
+        db.Index('uq_requisitions_display_id', 'display_id', unique=True),
+        # Employee listings and the IT "own requests" segment
+        db.Index('ix_requisitions_user_type_created', 'user_id', 'requisition_type', 'created_at'),
+        # IT listings
+        db.Index('ix_requisitions_type_created', 'requisition_type', 'created_at'),
+        db.Index('ix_requisitions_created', 'created_at'),
+        # Manager pending approvals and approval history
+        db.Index('ix_requisitions_status_type_created', 'status', 'requisition_type', 'created_at'),
+        db.Index('ix_requisitions_status_type_updated', 'status', 'requisition_type', 'updated_at'),
+        # Pending replacement confirmations
+        db.Index('ix_requisitions_replacement_pending', 'replacement_user_id', 'replacement_confirmed'),
+        # Conference room overlap checks and availability
+        db.Index('ix_requisitions_room_schedule', 'room_name', 'start_datetime', 'end_datetime'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     display_id = db.Column(db.String(20), nullable=False)
@@ -46,6 +76,7 @@ class Requisition(db.Model):
     replacement_user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
     requisition_type = db.Column(db.String(20), nullable=False)  # 'it', 'conference_room', 'leave'
     status = db.Column(db.String(20), nullable=False, default='pending')
+    # Legacy JSON history, superseded by RequisitionEvent; emptied by migration 8
     changelog = db.Column(db.Text, nullable=False, default='[]')
     
     # Common fields
@@ -76,53 +107,191 @@ class Requisition(db.Model):
     replacement_token = db.Column(db.String(100))
     
     def to_dict(self):
-        result = {
+        user = self.user
+        replacement_user = self.replacement_user if self.requisition_type == 'leave' else None
+        return serialize_requisition(
+            self,
+            user_name=user.full_name if user else None,
+            user_designation=user.designation if user else None,
+            user_email=user.email if user else None,
+            replacement_user_name=replacement_user.full_name if replacement_user else None
+        )
+    
+    @classmethod
+    def with_user_columns(cls, query):
+        """Project a requisition query onto plain columns plus requester and replacement names.
+
+        The returned rows expose the same attribute names as Requisition, so they can be
+        filtered, ordered and serialized without loading ORM objects or lazy relationships.
+        """
+        requester = aliased(User)
+        replacement = aliased(User)
+        columns = [column for column in cls.__table__.c if column.key not in ('replacement_token', 'changelog')]
+        return query.with_entities(
+            *columns,
+            requester.full_name.label('user_name'),
+            requester.designation.label('user_designation'),
+            requester.email.label('user_email'),
+            replacement.full_name.label('replacement_user_name')
+        ).outerjoin(
+            requester, cls.user_id == requester.id
+        ).outerjoin(
+            replacement, cls.replacement_user_id == replacement.id
+        )
+    
+    @staticmethod
+    def serialize_rows(rows):
+        """Serialize rows produced by with_user_columns"""
+        return [
+            serialize_requisition(
+                row,
+                user_name=row.user_name,
+                user_designation=row.user_designation,
+                user_email=row.user_email,
+                replacement_user_name=row.replacement_user_name
+            )
+            for row in rows
+        ]
+
+# Keys produced by serialize_requisition, shared by every type and added per type
+REQUISITION_COMMON_FIELDS = [
+    'id', 'display_id', 'user_id', 'replacement_user_id', 'requisition_type', 'status',
+    'subject', 'description', 'priority', 'created_at', 'updated_at',
+    'user_name', 'user_designation', 'user_email'
+]
+REQUISITION_TYPE_FIELDS = {
+    'it': ['it_category', 'assigned_to'],
+    'conference_room': ['room_name', 'start_datetime', 'end_datetime', 'attendees_count', 'equipment_needed'],
+    'leave': [
+        'leave_type', 'start_date', 'end_date', 'total_days', 'replacement_name',
+        'replacement_confirmed', 'replacement_user_name'
+    ]
+}
+
+def serialize_requisition(req, user_name, user_designation, user_email, replacement_user_name):
+    """Build the JSON representation of a requisition from an ORM object or column row"""
+    result = {
+        'id': req.id,
+        'display_id': req.display_id,
+        'user_id': req.user_id,
+        'replacement_user_id': req.replacement_user_id,
+        'requisition_type': req.requisition_type,
+        'status': req.status,
+        'subject': req.subject,
+        'description': req.description,
+        'priority': req.priority,
+        'created_at': req.created_at.isoformat() if req.created_at else None,
+        'updated_at': req.updated_at.isoformat() if req.updated_at else None,
+        'user_name': user_name,
+        'user_designation': user_designation,
+        'user_email': user_email
+    }
+    
+    # Add type-specific fields
+    if req.requisition_type == 'it':
+        result.update({
+            'it_category': req.it_category,
+            'assigned_to': req.assigned_to
+        })
+    elif req.requisition_type == 'conference_room':
+        result.update({
+            'room_name': req.room_name,
+            'start_datetime': req.start_datetime.isoformat() if req.start_datetime else None,
+            'end_datetime': req.end_datetime.isoformat() if req.end_datetime else None,
+            'attendees_count': req.attendees_count,
+            'equipment_needed': req.equipment_needed
+        })
+    elif req.requisition_type == 'leave':
+        result.update({
+            'leave_type': req.leave_type,
+            'start_date': req.start_date.isoformat() if req.start_date else None,
+            'end_date': req.end_date.isoformat() if req.end_date else None,
+            'total_days': req.total_days,
+            'replacement_name': req.replacement_name,
+            'replacement_confirmed': req.replacement_confirmed,
+            'replacement_user_name': replacement_user_name
+        })
+    
+    return result
+
+class RequisitionEvent(db.Model):
+    __tablename__ = 'requisition_events'
+    __table_args__ = (
+        db.Index('ix_requisition_events_requisition_timestamp', 'requisition_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    requisition_id = db.Column(db.String(36), db.ForeignKey('requisitions.id', ondelete='CASCADE'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    action = db.Column(db.String(50), nullable=False)
+    user = db.Column(db.String(120))
+    details = db.Column(db.Text)
+    
+    # Relationships
+    requisition = db.relationship('Requisition', backref=db.backref(
+        'events', lazy='dynamic', cascade='all, delete-orphan'
+    ))
+    
+    @classmethod
+    def record(cls, requisition, action, user, details):
+        """Append a changelog entry for a requisition to the current session"""
+        event = cls(requisition=requisition, action=action, user=user, details=details,
+                    timestamp=datetime.utcnow())
+        db.session.add(event)
+        return event
+    
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'action': self.action,
+            'user': self.user,
+            'details': self.details
+        }
+
+class Holiday(db.Model):
+    __tablename__ = 'holidays'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    date = db.Column(db.Date, unique=True, nullable=False)
+    name = db.Column(db.String(120), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
             'id': self.id,
-            'display_id': self.display_id,
+            'date': self.date.isoformat(),
+            'name': self.name
+        }
+
+class LeaveBalance(db.Model):
+    __tablename__ = 'leave_balances'
+    __table_args__ = (
+        # Company-wide reads for one year
+        db.Index('ix_leave_balances_year', 'year'),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    leave_type = db.Column(db.String(50), primary_key=True)
+    days_taken = db.Column(db.Integer, nullable=False, default=0)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
             'user_id': self.user_id,
-            'replacement_user_id': self.replacement_user_id,
-            'requisition_type': self.requisition_type,
-            'status': self.status,
-            'changelog': self.changelog,
-            'subject': self.subject,
-            'description': self.description,
-            'priority': self.priority,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'user_name': self.user.full_name if self.user else None,
-            'user_designation': self.user.designation if self.user else None,
-            'user_email': self.user.email if self.user else None
+            'year': self.year,
+            'leave_type': self.leave_type,
+            'days_taken': self.days_taken,
+            'requests': self.requests
         }
-        
-        # Add type-specific fields
-        if self.requisition_type == 'it':
-            result.update({
-                'it_category': self.it_category,
-                'assigned_to': self.assigned_to
-            })
-        elif self.requisition_type == 'conference_room':
-            result.update({
-                'room_name': self.room_name,
-                'start_datetime': self.start_datetime.isoformat() if self.start_datetime else None,
-                'end_datetime': self.end_datetime.isoformat() if self.end_datetime else None,
-                'attendees_count': self.attendees_count,
-                'equipment_needed': self.equipment_needed
-            })
-        elif self.requisition_type == 'leave':
-            result.update({
-                'leave_type': self.leave_type,
-                'start_date': self.start_date.isoformat() if self.start_date else None,
-                'end_date': self.end_date.isoformat() if self.end_date else None,
-                'total_days': self.total_days,
-                'replacement_name': self.replacement_name,
-                'replacement_confirmed': self.replacement_confirmed,
-                'replacement_user_name': self.replacement_user.full_name if self.replacement_user else None
-            })
-        
-        return result
 
 class Token(db.Model):
     __tablename__ = 'tokens'
+    __table_args__ = (
+        db.Index('ix_tokens_token_is_valid', 'token', 'is_valid'),
+        db.Index('ix_tokens_expires_at', 'expires_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -131,6 +300,22 @@ class Token(db.Model):
     expires_at = db.Column(db.DateTime, nullable=False)
     is_valid = db.Column(db.Boolean, default=True)
 
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    
+    # A token jti, "user:<id>" for revoking every token a user was issued, or
+    # "refresh:<id>" for revalidating cached tokens of a user
+    jti = db.Column(db.String(64), primary_key=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class Counter(db.Model):
     __tablename__ = 'counters'
     
@@ -140,11 +325,127 @@ class Counter(db.Model):
     
     @classmethod
     def get_next_value(cls, counter_name):
-        counter = cls.query.filter_by(name=counter_name).first()
-        if not counter:
-            counter = cls(name=counter_name, value=0)
-            db.session.add(counter)
+        return display_id_allocator.next_value(counter_name)
+    
+    @classmethod
+    def bump(cls, counter_name):
+        """Increment a revision counter as part of the caller's transaction.
+
+        The counter row stays locked until the caller commits, so concurrent
+        writers bumping the same counter commit one after another.
+        """
+        increment_row(cls.__table__, {'name': counter_name}, {'value': 1})
+        db.session.info.setdefault('bumped_counters', TallyCounter())[counter_name] += 1
+    
+    @classmethod
+    def committed_bumps(cls, counter_name):
+        """How many bumps of counter_name this process has committed since it started"""
+        with _committed_bumps_lock:
+            return _committed_bumps[counter_name]
+    
+    @classmethod
+    def get_values(cls, counter_names):
+        """Read several counters in one query, defaulting missing ones to 0"""
+        values = dict(db.session.query(cls.name, cls.value).filter(cls.name.in_(counter_names)).all())
+        return [values.get(name, 0) for name in counter_names]
+    
+    @classmethod
+    def reserve_block(cls, counter_name, size):
+        """Atomically advance a counter by size and return the last value of the claimed range.
+
+        Runs in its own short transaction so the claim neither waits for nor
+        holds locks for the duration of the caller's request.
+        """
+        table = cls.__table__
+        with db.engine.begin() as conn:
+            statement = table.update().where(table.c.name == counter_name).values(value=table.c.value + size)
+            if conn.dialect.update_returning:
+                last = conn.execute(statement.returning(table.c.value)).scalar()
+            else:
+                # The UPDATE holds the row lock, so the read below sees our own increment
+                last = None
+                if conn.execute(statement).rowcount:
+                    last = conn.execute(
+                        db.select(table.c.value).where(table.c.name == counter_name)
+                    ).scalar()
+            
+            if last is None:
+                conn.execute(table.insert().values(name=counter_name, value=size))
+                last = size
         
-        counter.value += 1
-        db.session.commit()
-        return counter.value
+        return last
+
+# Dialects that can insert-or-update a row in one statement
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def increment_row(table, key, increments, values=None):
+    """Add increments to the row of table matching key, creating the row if it is missing.
+
+    Runs in the caller's transaction. PostgreSQL and SQLite do it in a single
+    INSERT ... ON CONFLICT DO UPDATE; elsewhere an insert that loses the race
+    to a concurrent one is retried as an update, so neither way can fail on
+    the unique key.
+    """
+    values = values or {}
+    added = {column: table.c[column] + amount for column, amount in increments.items()}
+    upsert_insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if upsert_insert is not None:
+        db.session.execute(
+            upsert_insert(table).values(**key, **increments, **values)
+            .on_conflict_do_update(index_elements=list(key), set_={**added, **values})
+        )
+        return
+    
+    update = table.update().where(*(table.c[column] == value for column, value in key.items())).values(
+        **added, **values
+    )
+    if db.session.execute(update).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**key, **increments, **values))
+    except IntegrityError:
+        db.session.execute(update)
+
+# Bumps committed by this process, so readers can tell its own writes from other workers'
+_committed_bumps = TallyCounter()
+_committed_bumps_lock = threading.Lock()
+
+@event.listens_for(Session, 'after_commit')
+def _record_committed_bumps(session):
+    bumped = session.info.pop('bumped_counters', None)
+    if bumped:
+        with _committed_bumps_lock:
+            _committed_bumps.update(bumped)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_bumps(session):
+    session.info.pop('bumped_counters', None)
+
+class DisplayIdAllocator:
+    """Hands out counter values from blocks reserved with Counter.reserve_block.
+
+    With a block size of 1 every value is claimed with a single atomic UPDATE.
+    Larger blocks let a worker serve creations from memory; values stay unique
+    across workers, but unused values in a block are skipped when the worker exits.
+    """
+    
+    def __init__(self):
+        self._blocks = {}  # counter name -> (next value, last reserved value)
+        self._lock = threading.Lock()
+    
+    def next_value(self, counter_name):
+        with self._lock:
+            next_value, last = self._blocks.get(counter_name, (1, 0))
+            if next_value > last:
+                size = max(1, current_app.config.get('DISPLAY_ID_BLOCK_SIZE', 1))
+                try:
+                    last = Counter.reserve_block(counter_name, size)
+                except IntegrityError:
+                    # Another worker created the counter row first
+                    last = Counter.reserve_block(counter_name, size)
+                next_value = last - size + 1
+            self._blocks[counter_name] = (next_value + 1, last)
+            return next_value
+
+display_id_allocator = DisplayIdAllocator()
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class PasswordPoolBusy(Exception):
+    """Raised when a password operation waited longer than PASSWORD_VERIFY_TIMEOUT"""
+
+class PasswordPool:
+    """Bounded thread pool for password hashing and verification.
+
+    werkzeug's scrypt and pbkdf2 run in hashlib, which releases the GIL, so
+    the pool runs hashes in parallel while capping how many cores they can
+    take. Cheap requests then keep getting CPU during a login burst. That
+    needs threaded workers (gunicorn.conf.py sets gthread): the caller's
+    thread waits on the pool, so on a sync worker nothing else would run.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._workers = 1
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+
+    def _get_executor(self):
+        # Created lazily so every forked worker gets its own threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    workers = current_app.config.get('PASSWORD_VERIFY_CONCURRENCY') or os.cpu_count() or 1
+                    self._workers = workers
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        return self._executor
+
+    def run(self, func, *args):
+        """Run func in the pool, raising PasswordPoolBusy if it cannot finish in time"""
+        submitted = time.perf_counter()
+
+        def timed():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                self.queue_seconds_total += waited
+                self.queue_seconds_max = max(self.queue_seconds_max, waited)
+            return func(*args)
+
+        with self._lock:
+            self.in_flight += 1
+        future = self._get_executor().submit(timed)
+        try:
+            result = future.result(timeout=current_app.config.get('PASSWORD_VERIFY_TIMEOUT', 10))
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def map(self, func, items):
+        """Apply func to every item in the pool, returning the results in order.
+
+        At most one task per pool thread is queued at a time, so logins
+        submitted meanwhile wait behind a few hashes, not the whole batch.
+        """
+        executor = self._get_executor()
+        results = []
+        pending = deque()
+        for item in items:
+            if len(pending) >= self._workers:
+                results.append(pending.popleft().result())
+            pending.append(executor.submit(func, item))
+        while pending:
+            results.append(pending.popleft().result())
+
+        with self._lock:
+            self.completed += len(results)
+        return results
+
+    def stats(self):
+        return {
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'queue_seconds_avg': self.queue_seconds_total / self.completed if self.completed else 0.0,
+            'queue_seconds_max': self.queue_seconds_max
+        }
+
+password_pool = PasswordPool()
+_method_prefixes = {}
+
+def hash_method():
+    return current_app.config.get('PASSWORD_HASH_METHOD') or 'scrypt'
+
+def _method_prefix(method):
+    """The method$ prefix werkzeug writes for method, including its default parameters"""
+    if method not in _method_prefixes:
+        _method_prefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _method_prefixes[method]
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with different parameters than configured"""
+    return password_hash.split('$', 1)[0] != _method_prefix(hash_method())
+
+def hash_password(password):
+    return password_pool.run(generate_password_hash, password, hash_method())
+
+def verify_password(password_hash, password):
+    return password_pool.run(check_password_hash, password_hash, password)
+
+def hash_passwords(passwords):
+    """Hash many passwords on the password pool's threads, preserving order"""
+    return password_pool.map(partial(generate_password_hash, method=hash_method()), passwords)
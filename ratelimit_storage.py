@@ -0,0 +1,224 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from math import floor
+from urllib.parse import parse_qs, urlparse
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+
+MAGIC = b'PESRL001'
+HEADER = struct.Struct('<8sq')  # magic, slot count
+# Key digest, time the slot can be reused, window index, current count, previous count
+SLOT = struct.Struct('<16sdqqq')
+EMPTY_DIGEST = bytes(16)
+DEFAULT_SLOTS = 65536
+PROBE_LENGTH = 8
+
+class SharedMemoryStorage(Storage, SlidingWindowCounterSupport):
+    """Rate limit counters in a memory-mapped file shared by every local worker.
+
+    Selected with RATELIMIT_STORAGE_URI=mmap:///path/to/file (optionally
+    ?slots=N). The file holds a fixed table of slots addressed by a hash of
+    the limit key, so memory stays bounded however many clients show up.
+    Each slot keeps the current and previous window counts of a sliding
+    window counter; a slot whose windows have both ended reads as empty and
+    is reused in place, so nothing needs sweeping. Updates take a thread lock
+    and an exclusive flock on the file, which makes them atomic across
+    processes and threads. If every slot a key probes is live, the one
+    expiring first is evicted, so undersizing the table loosens limits
+    rather than failing requests.
+    """
+
+    STORAGE_SCHEME = ['mmap']
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        parsed = urlparse(uri or '')
+        query = parse_qs(parsed.query)
+        self.path = parsed.path
+        self.slots = int(options.get('slots') or query.get('slots', [DEFAULT_SLOTS])[0])
+        self._pid = None
+        self._reopen_lock = threading.Lock()
+        self._open()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    def _open(self):
+        """Map the file, creating and sizing it if this is the first process to use it"""
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < HEADER.size:
+                os.ftruncate(self._fd, HEADER.size + self.slots * SLOT.size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, self.slots), 0)
+            magic, slots = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a rate limit table")
+            # An existing table keeps its size so every worker agrees on slot positions
+            self.slots = slots
+            self._map = mmap.mmap(self._fd, HEADER.size + slots * SLOT.size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._pid = os.getpid()
+
+    def _lock(self):
+        # A forked child shares the parent's open file, which would make flock a no-op between them
+        if self._pid != os.getpid():
+            # Only one thread of the child may reopen; a second close could hit an fd already reused
+            with self._reopen_lock:
+                if self._pid != os.getpid():
+                    self._map.close()
+                    os.close(self._fd)
+                    self._open()
+        return _TableLock(self._thread_lock, self._fd)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError)
+
+    def _find(self, digest, now):
+        """Offset of the slot holding digest, or of the slot it should be written to"""
+        start = int.from_bytes(digest[:8], 'little') % self.slots
+        free = None
+        victim, victim_dead_at = None, None
+        for probe in range(PROBE_LENGTH):
+            offset = HEADER.size + ((start + probe) % self.slots) * SLOT.size
+            slot_digest = self._map[offset:offset + 16]
+            if slot_digest == digest:
+                return offset, True
+            if free is None:
+                if slot_digest == EMPTY_DIGEST:
+                    free = offset
+                    continue
+                dead_at = SLOT.unpack_from(self._map, offset)[1]
+                if dead_at <= now:
+                    free = offset
+                elif victim is None or dead_at < victim_dead_at:
+                    victim, victim_dead_at = offset, dead_at
+        return (free if free is not None else victim), False
+
+    def _read(self, key, now):
+        """(digest, offset, dead_at, window, current, previous) of key, zeroed if absent or expired"""
+        digest = _digest(key)
+        offset, found = self._find(digest, now)
+        if found:
+            _, dead_at, window, current, previous = SLOT.unpack_from(self._map, offset)
+            if dead_at > now:
+                return digest, offset, dead_at, window, current, previous
+        return digest, offset, 0.0, 0, 0, 0
+
+    def _roll(self, key, expiry, now):
+        """Read key's sliding window, moved forward to the window containing now"""
+        digest, offset, _, window, current, previous = self._read(key, now)
+        index = int(now // expiry)
+        if window == index - 1:
+            previous, current = current, 0
+        elif window != index:
+            previous, current = 0, 0
+        return digest, offset, index, current, previous
+
+    # Fixed window
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        with self._lock():
+            digest, offset, dead_at, _, count, _ = self._read(key, now)
+            if not count:
+                dead_at = now + expiry
+            count += amount
+            SLOT.pack_into(self._map, offset, digest, dead_at, 0, count, 0)
+            return count
+
+    def get(self, key):
+        now = time.time()
+        with self._lock():
+            return self._read(key, now)[4]
+
+    def get_expiry(self, key):
+        now = time.time()
+        with self._lock():
+            dead_at = self._read(key, now)[2]
+            return dead_at or now
+
+    def clear(self, key):
+        now = time.time()
+        with self._lock():
+            digest = _digest(key)
+            offset, found = self._find(digest, now)
+            if found:
+                SLOT.pack_into(self._map, offset, EMPTY_DIGEST, 0.0, 0, 0, 0)
+
+    # Sliding window counter
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        with self._lock():
+            digest, offset, index, current, previous = self._roll(key, expiry, now)
+            weighted = previous * _previous_ttl(now, expiry) / expiry + current
+            if floor(weighted) + amount > limit:
+                return False
+            SLOT.pack_into(self._map, offset, digest, (index + 2) * expiry, index, current + amount, previous)
+            return True
+
+    def get_sliding_window(self, key, expiry):
+        now = time.time()
+        with self._lock():
+            _, _, _, current, previous = self._roll(key, expiry, now)
+        previous_ttl = _previous_ttl(now, expiry) if previous else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous, previous_ttl, current, current_ttl
+
+    def clear_sliding_window(self, key, expiry):
+        self.clear(key)
+
+    def check(self):
+        return not self._map.closed
+
+    def reset(self):
+        now = time.time()
+        cleared = 0
+        with self._lock():
+            for slot in range(self.slots):
+                offset = HEADER.size + slot * SLOT.size
+                if self._map[offset:offset + 16] != EMPTY_DIGEST:
+                    if SLOT.unpack_from(self._map, offset)[1] > now:
+                        cleared += 1
+                    SLOT.pack_into(self._map, offset, EMPTY_DIGEST, 0.0, 0, 0, 0)
+        return cleared
+
+class _TableLock:
+    """Hold the in-process lock, then the file lock shared with other processes"""
+
+    __slots__ = ('_thread_lock', '_fd')
+
+    def __init__(self, thread_lock, fd):
+        self._thread_lock = thread_lock
+        self._fd = fd
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+def _digest(key):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    # The all-zero digest marks an empty slot
+    return digest if digest != EMPTY_DIGEST else b'\x01' + digest[1:]
+
+def _previous_ttl(now, expiry):
+    """Seconds of the previous window still inside the sliding window"""
+    return (1 - (((now - expiry) / expiry) % 1)) * expiry
@@ -25,12 +25,38 @@ async function initializeRequisitions() {
             await initializeLeaveRequests();
         }
         
+        subscribeToRequisitionChanges(handleRequisitionChange);
+        
     } catch (error) {
         console.error('Requisitions initialization error:', error);
         showAlert('Failed to initialize requisitions', 'danger');
     }
 }
 
+// Apply pushed changes to the list on screen instead of refetching it
+function handleRequisitionChange(event, data) {
+    if (event === 'reset') {
+        loadRequisitions(currentRequisitionType);
+        return;
+    }
+    if (data.requisition_type !== currentRequisitionType) return;
+    
+    if (event === 'resync') {
+        loadRequisitions(currentRequisitionType);
+        return;
+    }
+    
+    const index = currentRequisitions.findIndex(req => req.id === data.id);
+    if (event === 'deleted') {
+        if (index !== -1) currentRequisitions.splice(index, 1);
+    } else if (index !== -1) {
+        currentRequisitions[index] = data;
+    } else {
+        currentRequisitions.unshift(data);
+    }
+    renderRequisitions(currentRequisitionType);
+}
+
 // Initialize IT Requisitions
 async function initializeITRequisitions() {
     await loadRequisitions('it');
@@ -410,13 +436,19 @@ async function handleLeaveRequestSubmit(event) {
 }
 
 // Calculate leave days
-function calculateLeaveDays() {
+async function calculateLeaveDays() {
     const startDate = document.getElementById('leaveStartDate').value;
     const endDate = document.getElementById('leaveEndDate').value;
     
     if (startDate && endDate) {
-        const days = calculateBusinessDays(startDate, endDate);
-        document.getElementById('leaveTotalDays').value = days;
+        // Show the weekday count at once, then the server's holiday-aware total
+        document.getElementById('leaveTotalDays').value = calculateBusinessDays(startDate, endDate);
+        try {
+            const response = await api.get('/leave/business-days', { params: { start: startDate, end: endDate } });
+            document.getElementById('leaveTotalDays').value = response.data.total_days;
+        } catch (error) {
+            console.error('Business days error:', error);
+        }
     }
 }
 
@@ -603,6 +635,7 @@ function viewRequisitionDetails(requisitionId) {
     
     if (content) {
         content.innerHTML = renderRequisitionDetailsContent(req);
+        loadProgressHistory(req.id);
     }
     
     if (actions) {
@@ -687,14 +720,6 @@ function renderRequisitionDetailsContent(req) {
         `;
     }
     
-    // Parse changelog
-    let changelog = [];
-    try {
-        changelog = JSON.parse(req.changelog || '[]');
-    } catch (e) {
-        console.error('Error parsing changelog:', e);
-    }
-    
     return `
         <div class="row mb-4">
             <div class="col-md-8">
@@ -731,11 +756,33 @@ function renderRequisitionDetailsContent(req) {
         
         <div class="mb-3">
             <h6><i class="fas fa-history me-2"></i>Progress History</h6>
-            ${changelog.length > 0 ? renderProgressHistory(changelog) : '<p class="text-muted">No progress history available.</p>'}
+            <div id="progressHistory-${req.id}">
+                <p class="text-muted">Loading progress history...</p>
+            </div>
         </div>
     `;
 }
 
+// Fetch a requisition's changelog, which list responses no longer carry
+async function fetchChangelog(requisitionId) {
+    const response = await api.get(`/requisitions/${requisitionId}/changelog`);
+    return response.data.changelog || [];
+}
+
+// Load progress history into the details modal
+async function loadProgressHistory(requisitionId) {
+    const container = document.getElementById(`progressHistory-${requisitionId}`);
+    if (!container) return;
+    
+    try {
+        const changelog = await fetchChangelog(requisitionId);
+        container.innerHTML = changelog.length > 0 ? renderProgressHistory(changelog) : '<p class="text-muted">No progress history available.</p>';
+    } catch (error) {
+        console.error('Error loading changelog:', error);
+        container.innerHTML = '<p class="text-muted">Failed to load progress history.</p>';
+    }
+}
+
 // Render progress history timeline
 function renderProgressHistory(changelog) {
     return `
@@ -951,7 +998,7 @@ async function exportRequisition(requisitionId) {
         // Add changelog history
         let changelog = [];
         try {
-            changelog = JSON.parse(req.changelog || '[]');
+            changelog = await fetchChangelog(req.id);
         } catch (e) {
             changelog = [];
         }
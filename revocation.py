@@ -0,0 +1,102 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from app import db
+from models import RevokedToken
+
+# Each sync re-reads revocations this far behind the newest one seen, so rows
+# committed out of revoked_at order by other workers are not skipped
+SYNC_OVERLAP = timedelta(seconds=60)
+
+class RevocationList:
+    """Memory-resident denylist of revoked JWTs, persisted in the revoked_tokens table.
+
+    Entries are keyed by jti, or by "user:<id>" to revoke every token issued to a
+    user before a point in time, or by "refresh:<id>" to make workers revalidate
+    tokens of a user they validated before a point in time. Each worker keeps the list in memory and pulls
+    newly revoked entries at most once per refresh_interval, so checking a token
+    normally costs no database round-trip. Entries are dropped once the tokens
+    they cover would have expired anyway.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._entries = {}  # key -> (expires_ts, revoked_ts)
+        self._high_water = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def user_key(user_id):
+        return f"user:{user_id}"
+
+    @staticmethod
+    def refresh_key(user_id):
+        return f"refresh:{user_id}"
+
+    def _remember(self, key, revoked_at, expires_at):
+        self._entries[key] = (_utc_timestamp(expires_at), _utc_timestamp(revoked_at))
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.refresh_interval:
+            return
+
+        with self._lock:
+            if self._synced_at is not None and now - self._synced_at < self.refresh_interval:
+                return
+
+            query = RevokedToken.query.filter(RevokedToken.expires_at > datetime.utcnow())
+            if self._high_water is not None:
+                query = query.filter(RevokedToken.revoked_at >= self._high_water - SYNC_OVERLAP)
+            # Only rows read back from the table move the high-water mark; a
+            # local revoke() must not skip what other workers wrote before it
+            for entry in query.all():
+                self._remember(entry.jti, entry.revoked_at, entry.expires_at)
+                if self._high_water is None or entry.revoked_at > self._high_water:
+                    self._high_water = entry.revoked_at
+
+            expired_before = time.time()
+            self._entries = {
+                key: value for key, value in self._entries.items() if value[0] > expired_before
+            }
+            self._synced_at = now
+
+    def revoke(self, key, expires_at):
+        """Persist and remember a revocation that lapses at expires_at"""
+        now = datetime.utcnow()
+        db.session.merge(RevokedToken(jti=key, revoked_at=now, expires_at=expires_at))
+        RevokedToken.query.filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+        db.session.commit()
+
+        with self._lock:
+            self._remember(key, now, expires_at)
+
+    def is_revoked(self, claims):
+        """Check decoded JWT claims against the token and user entries"""
+        self._sync()
+        now = time.time()
+
+        entry = self._entries.get(claims['jti'])
+        if entry and entry[0] > now:
+            return True
+
+        entry = self._entries.get(self.user_key(claims['user_id']))
+        if entry and entry[0] > now and claims['iat'] < entry[1]:
+            return True
+
+        return False
+
+    def is_stale(self, user_id, validated_at):
+        """Whether a validation made at validated_at (a POSIX timestamp) predates a refresh entry of the user"""
+        self._sync()
+        entry = self._entries.get(self.refresh_key(user_id))
+        return bool(entry) and entry[0] > time.time() and validated_at < entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+def _utc_timestamp(dt):
+    """POSIX timestamp of a naive UTC datetime, independent of the server's local timezone"""
+    return dt.replace(tzinfo=timezone.utc).timestamp()
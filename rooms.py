@@ -0,0 +1,227 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Requisition, Counter, REQUISITIONS_REVISION
+
+CONFERENCE_ROOMS = ['Conference Room A', 'Conference Room B', 'Meeting Room 1', 'Meeting Room 2', 'Board Room']
+
+# A declined booking does not hold its room
+BLOCKING_STATUSES = ['pending', 'approved', 'in_progress', 'completed']
+
+ROOMS_REVISION = REQUISITIONS_REVISION.format('conference_room')
+
+def parse_booking_datetime(value):
+    """Parse an ISO 8601 booking time, normalising offset-aware values to naive UTC"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def is_blocking(requisition):
+    return (
+        requisition.requisition_type == 'conference_room' and
+        requisition.status in BLOCKING_STATUSES and
+        requisition.room_name and requisition.start_datetime and requisition.end_datetime
+    )
+
+def lock_room(room_name):
+    """Serialize concurrent bookings of one room until the transaction ends.
+
+    PostgreSQL takes an advisory lock per room. SQLite has no advisory locks,
+    and its database-wide write lock would block the display id allocator's
+    own transaction, so there each room gets an flock'd file next to the
+    database instead. That covers every thread and process on the host, which
+    is every writer a SQLite file can have. Other dialects are not locked.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        db.session.execute(db.text("SELECT pg_advisory_xact_lock(hashtext(:room))"), {'room': room_name})
+    elif dialect == 'sqlite':
+        held = db.session.info.setdefault('room_locks', {})
+        if room_name not in held:
+            lock = open(_room_lock_path(room_name), 'a')
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            held[room_name] = lock
+
+def _room_lock_path(room_name):
+    database = db.session.get_bind().url.database
+    if database and database != ':memory:':
+        directory = database + '-room-locks'
+    else:
+        # An in-memory database is private to this process
+        directory = os.path.join(tempfile.gettempdir(), f'pes-room-locks-{os.getpid()}')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, hashlib.sha1(room_name.encode()).hexdigest() + '.lock')
+
+@event.listens_for(Session, 'after_transaction_end')
+def _release_room_locks(session, transaction):
+    if transaction.parent is None:
+        for lock in session.info.pop('room_locks', {}).values():
+            lock.close()
+
+def conflict_query(room_name, start, end, exclude_id=None):
+    """Bookings of room_name overlapping [start, end), served by the room schedule index"""
+    query = Requisition.query.filter(
+        Requisition.room_name == room_name,
+        Requisition.start_datetime < end,
+        Requisition.end_datetime > start,
+        Requisition.requisition_type == 'conference_room',
+        Requisition.status.in_(BLOCKING_STATUSES)
+    )
+    if exclude_id:
+        query = query.filter(Requisition.id != exclude_id)
+    return query.order_by(Requisition.start_datetime)
+
+def find_conflict(room_name, start, end, exclude_id=None):
+    return conflict_query(room_name, start, end, exclude_id).first()
+
+class _Room:
+    __slots__ = ('starts', 'bookings', 'max_length')
+
+    def __init__(self):
+        self.starts = []
+        self.bookings = []  # sorted by start, parallel to starts
+        self.max_length = timedelta(0)
+
+class RoomSchedule:
+    """In-memory per-room interval index of bookings that hold a room.
+
+    Bookings are kept sorted by start together with the longest booking
+    length, so an overlap query only bisects and scans bookings that
+    start within one maximum length before the window. Writes from this worker
+    are applied in place; writes from other workers are noticed through the
+    conference room revision counter and trigger a rebuild.
+    """
+
+    def __init__(self):
+        self._rooms = {}
+        self._located = {}  # requisition id -> (room name, start)
+        self._revision = None
+        self._lock = threading.Lock()
+
+    def _insert(self, booking):
+        room = self._rooms.setdefault(booking['room_name'], _Room())
+        position = bisect_right(room.starts, booking['start'])
+        room.starts.insert(position, booking['start'])
+        room.bookings.insert(position, booking)
+        room.max_length = max(room.max_length, booking['end'] - booking['start'])
+        self._located[booking['id']] = (booking['room_name'], booking['start'])
+
+    def _remove(self, requisition_id):
+        located = self._located.pop(requisition_id, None)
+        if located is None:
+            return
+        room = self._rooms[located[0]]
+        position = bisect_left(room.starts, located[1])
+        while room.bookings[position]['id'] != requisition_id:
+            position += 1
+        del room.starts[position]
+        del room.bookings[position]
+
+    @staticmethod
+    def _booking(row):
+        return {
+            'id': row.id,
+            'display_id': row.display_id,
+            'room_name': row.room_name,
+            'start': row.start_datetime,
+            'end': row.end_datetime,
+            'status': row.status
+        }
+
+    def rebuild(self):
+        revision = Counter.get_values([ROOMS_REVISION])[0]
+        rows = db.session.query(
+            Requisition.id, Requisition.display_id, Requisition.room_name,
+            Requisition.start_datetime, Requisition.end_datetime, Requisition.status
+        ).filter(
+            Requisition.requisition_type == 'conference_room',
+            Requisition.status.in_(BLOCKING_STATUSES),
+            Requisition.room_name.isnot(None),
+            Requisition.start_datetime.isnot(None),
+            Requisition.end_datetime.isnot(None)
+        ).order_by(Requisition.start_datetime).all()
+
+        with self._lock:
+            self._rooms.clear()
+            self._located.clear()
+            for row in rows:
+                self._insert(self._booking(row))
+            self._revision = revision
+
+    def _refresh(self):
+        if self._revision is None or self._revision != Counter.get_values([ROOMS_REVISION])[0]:
+            self.rebuild()
+
+    def _after_write(self, change):
+        with self._lock:
+            if self._revision is None:
+                return
+            known_revision = self._revision
+            change()
+
+        # If ours was the only write since the last sync, the index is still current
+        revision = Counter.get_values([ROOMS_REVISION])[0]
+        with self._lock:
+            self._revision = revision if revision == known_revision + 1 else None
+
+    def apply(self, requisition):
+        """Reflect a committed create or update of a conference room requisition"""
+        def change():
+            self._remove(requisition.id)
+            if is_blocking(requisition):
+                self._insert(self._booking(requisition))
+        self._after_write(change)
+
+    def apply_many(self, requisitions):
+        """Reflect several updates committed together under one revision bump"""
+        def change():
+            for requisition in requisitions:
+                self._remove(requisition.id)
+                if is_blocking(requisition):
+                    self._insert(self._booking(requisition))
+        self._after_write(change)
+
+    def remove(self, requisition_id):
+        """Reflect a committed delete"""
+        self._after_write(lambda: self._remove(requisition_id))
+
+    def availability(self, start, end, room_names=None):
+        """Bookings and free slots per room within [start, end)"""
+        self._refresh()
+        with self._lock:
+            names = room_names or sorted(set(CONFERENCE_ROOMS) | set(self._rooms))
+            result = []
+            for name in names:
+                bookings = []
+                room = self._rooms.get(name)
+                if room is not None:
+                    lo = bisect_left(room.starts, start - room.max_length)
+                    hi = bisect_left(room.starts, end)
+                    bookings = [b for b in room.bookings[lo:hi] if b['end'] > start]
+                result.append({'room_name': name, 'bookings': bookings, 'free': _free_slots(bookings, start, end)})
+            return result
+
+def _free_slots(bookings, start, end):
+    slots = []
+    cursor = start
+    for booking in bookings:
+        if booking['start'] > cursor:
+            slots.append({'start': cursor, 'end': min(booking['start'], end)})
+        cursor = max(cursor, booking['end'])
+        if cursor >= end:
+            break
+    if cursor < end:
+        slots.append({'start': cursor, 'end': end})
+    return slots
+
+room_schedule = RoomSchedule()
@@ -0,0 +1,174 @@
+import re
+import threading
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from app import db
+from models import User, Counter, USERS_REVISION
+
+class UserSearchIndex:
+    """In-memory n-gram index over active users' full names and usernames.
+
+    Used when the database offers neither FTS5 nor pg_trgm. Writes made by this
+    worker are applied incrementally; writes from other workers are noticed
+    through the users revision counter and trigger a rebuild.
+    """
+
+    def __init__(self):
+        self._users = {}  # id -> (full_name, username)
+        self._grams = defaultdict(set)  # bigram/trigram -> user ids
+        self._revision = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _grams_of(value):
+        value = value.lower()
+        for size in (2, 3):
+            for i in range(len(value) - size + 1):
+                yield value[i:i + size]
+
+    def _add(self, user_id, full_name, username):
+        self._users[user_id] = (full_name, username)
+        for field in (full_name, username):
+            for gram in self._grams_of(field or ''):
+                self._grams[gram].add(user_id)
+
+    def _remove(self, user_id):
+        previous = self._users.pop(user_id, None)
+        if previous is None:
+            return
+        for field in previous:
+            for gram in self._grams_of(field or ''):
+                ids = self._grams.get(gram)
+                if ids is not None:
+                    ids.discard(user_id)
+                    if not ids:
+                        del self._grams[gram]
+
+    def rebuild(self):
+        revision = Counter.get_values([USERS_REVISION])[0]
+        rows = db.session.query(User.id, User.full_name, User.username).filter(User.is_active == True).all()
+        with self._lock:
+            self._users.clear()
+            self._grams.clear()
+            for row in rows:
+                self._add(row.id, row.full_name, row.username)
+            self._revision = revision
+
+    def index_user(self, user):
+        """Apply a committed change to one user without a full rebuild"""
+        with self._lock:
+            if self._revision is None:
+                return
+            known_revision = self._revision
+            self._remove(user.id)
+            if user.is_active:
+                self._add(user.id, user.full_name, user.username)
+
+        # If ours was the only write since the last sync, the index is still current
+        revision = Counter.get_values([USERS_REVISION])[0]
+        with self._lock:
+            self._revision = revision if revision == known_revision + 1 else None
+
+    def search(self, query, limit=10):
+        if self._revision is None or self._revision != Counter.get_values([USERS_REVISION])[0]:
+            self.rebuild()
+
+        needle = query.lower()
+        size = 3 if len(needle) >= 3 else 2
+        with self._lock:
+            candidates = None
+            for i in range(len(needle) - size + 1):
+                ids = self._grams.get(needle[i:i + size], set())
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+
+            matches = []
+            for user_id in candidates:
+                full_name, username = self._users[user_id]
+                rank = _match_rank(needle, full_name, username)
+                if rank is not None:
+                    matches.append((rank, full_name.lower(), user_id, full_name, username))
+
+        matches.sort()
+        return [
+            {'id': user_id, 'full_name': full_name, 'username': username}
+            for _, _, user_id, full_name, username in matches[:limit]
+        ]
+
+def _match_rank(needle, full_name, username):
+    """Lower is better: whole-field prefix, then word prefix, then substring"""
+    best = None
+    for field in (full_name or '', username or ''):
+        value = field.lower()
+        if value.startswith(needle):
+            rank = 0
+        elif any(word.startswith(needle) for word in re.split(r'[\s._-]+', value)):
+            rank = 1
+        elif needle in value:
+            rank = 2
+        else:
+            continue
+        best = rank if best is None else min(best, rank)
+    return best
+
+memory_index = UserSearchIndex()
+_backends = {}
+
+def search_backend():
+    """Pick the user search backend for the current database: fts5, trigram or memory"""
+    engine = db.engine
+    if engine.url not in _backends:
+        with engine.connect() as conn:
+            if conn.dialect.name == 'sqlite':
+                found = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+                )).first()
+                backend = 'fts5' if found else 'memory'
+            elif conn.dialect.name == 'postgresql':
+                found = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+                backend = 'trigram' if found else 'memory'
+            else:
+                backend = 'memory'
+        _backends[engine.url] = backend
+    return _backends[engine.url]
+
+def _fts_match_expression(query):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
+def search_users(query, limit=10):
+    """Return up to limit active users matching query, best matches first"""
+    backend = search_backend()
+
+    if backend == 'fts5':
+        rows = db.session.execute(text(
+            "SELECT users.id, users.full_name, users.username "
+            "FROM users_fts JOIN users ON users.id = users_fts.rowid "
+            "WHERE users_fts MATCH :match AND users.is_active = 1 "
+            "ORDER BY bm25(users_fts), users.full_name LIMIT :limit"
+        ), {'match': _fts_match_expression(query), 'limit': limit}).all()
+    elif backend == 'trigram':
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', query) + '%'
+        rows = db.session.query(User.id, User.full_name, User.username).filter(
+            User.is_active == True,
+            User.full_name.ilike(pattern, escape='\\') | User.username.ilike(pattern, escape='\\')
+        ).order_by(
+            db.func.greatest(
+                db.func.similarity(User.full_name, query),
+                db.func.similarity(User.username, query)
+            ).desc(),
+            User.full_name
+        ).limit(limit).all()
+    else:
+        return memory_index.search(query, limit)
+
+    return [{'id': row.id, 'full_name': row.full_name, 'username': row.username} for row in rows]
+
+def index_user(user):
+    """Keep the in-memory fallback index in step with a committed user change"""
+    if search_backend() == 'memory':
+        memory_index.index_user(user)
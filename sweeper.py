@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import db
+from models import Token, RevokedToken
+
+def sweep_tokens(batch_size=1000, pause=0.0):
+    """Delete expired and invalidated tokens in small batches.
+
+    Each batch is its own short transaction so the sweep never holds long locks
+    on the tokens table. Returns the number of rows removed and the time taken.
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    deleted = 0
+    
+    while True:
+        ids = [row.id for row in db.session.query(Token.id).filter(
+            db.or_(Token.expires_at < now, Token.is_valid == False)
+        ).limit(batch_size).all()]
+        if not ids:
+            break
+        
+        deleted += Token.query.filter(Token.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    
+    # Revocations are only needed until the tokens they cover expire
+    revocations_deleted = RevokedToken.query.filter(
+        RevokedToken.expires_at < now
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    
+    return {
+        'tokens_deleted': deleted,
+        'revocations_deleted': revocations_deleted,
+        'elapsed_seconds': time.perf_counter() - started
+    }
+
+@click.command('sweep-tokens')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per transaction')
+@click.option('--pause', default=0.0, show_default=True, help='Seconds to sleep between batches')
+@with_appcontext
+def sweep_tokens_command(batch_size, pause):
+    """Delete expired and invalidated tokens"""
+    result = sweep_tokens(batch_size=batch_size, pause=pause)
+    click.echo(
+        f"Removed {result['tokens_deleted']} tokens and {result['revocations_deleted']} "
+        f"revocations in {result['elapsed_seconds']:.2f}s"
+    )
+
+def start_background_sweeper(app, interval, batch_size=1000):
+    """Run sweep_tokens every interval seconds in a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    result = sweep_tokens(batch_size=batch_size)
+                    current_app.logger.info(
+                        f"Token sweep removed {result['tokens_deleted']} tokens and "
+                        f"{result['revocations_deleted']} revocations in {result['elapsed_seconds']:.2f}s"
+                    )
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Token sweep error: {e}")
+                finally:
+                    db.session.remove()
+    
+    thread = threading.Thread(target=run, name='token-sweeper', daemon=True)
+    thread.start()
+    return thread
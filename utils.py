@@ -1,5 +1,10 @@
 from datetime import datetime
-from flask import current_app
+from functools import wraps
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import base64
+import json
 import logging
 
 def log_error(message, error=None):
@@ -9,6 +14,52 @@ def log_error(message, error=None):
     else:
         current_app.logger.error(message)
 
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    """Count statements for views wrapped in sql_statement_budget"""
+    if has_app_context() and 'sql_statement_count' in g:
+        g.sql_statement_count += 1
+
+def sql_statement_budget(max_statements):
+    """Fail a request in testing mode if it issues more than max_statements SQL statements.
+
+    Guards list endpoints against N+1 regressions. Enabled when the app is in testing
+    mode or SQL_STATEMENT_BUDGETS is set; otherwise the decorator is a pass-through.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not (current_app.testing or current_app.config.get('SQL_STATEMENT_BUDGETS')):
+                return f(*args, **kwargs)
+            
+            g.sql_statement_count = 0
+            try:
+                response = f(*args, **kwargs)
+            finally:
+                statement_count = g.pop('sql_statement_count')
+            
+            assert statement_count <= max_statements, (
+                f"{request.endpoint} issued {statement_count} SQL statements "
+                f"(budget is {max_statements})"
+            )
+            return response
+        return decorated
+    return decorator
+
+def etag_matches(etag):
+    """Check whether the request's If-None-Match already covers a weak ETag"""
+    return request.if_none_match.contains_weak(etag)
+
+def not_modified(etag):
+    """Empty 304 response for a conditional GET whose ETag still matches"""
+    return with_etag(current_app.response_class(status=304), etag)
+
+def with_etag(response, etag):
+    """Attach a weak ETag and make browsers revalidate before reusing the response"""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 def format_datetime(dt):
     """Format datetime for display"""
     if not dt:
@@ -22,27 +73,25 @@ def format_date(d):
     return d.strftime('%Y-%m-%d')
 
 def calculate_business_days(start_date, end_date):
-    """Calculate business days between two dates"""
+    """Calculate business days between two dates, inclusive, excluding weekends and holidays"""
     if not start_date or not end_date:
         return 0
     
-    # Simple calculation - can be enhanced to exclude holidays
-    delta = end_date - start_date
-    days = delta.days + 1
-    
-    # Remove weekends (rough calculation)
-    weeks = days // 7
-    remaining_days = days % 7
-    
-    # Count weekdays in remaining days
-    weekdays = 0
-    current_date = start_date
-    for i in range(remaining_days):
-        if current_date.weekday() < 5:  # Monday = 0, Friday = 4
-            weekdays += 1
-        current_date = current_date + timedelta(days=1)
-    
-    return weeks * 5 + weekdays
+    from business_calendar import business_calendar
+    return business_calendar.business_days(start_date, end_date)
+
+def encode_cursor(values):
+    """Encode pagination keys as an opaque, URL-safe cursor string"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, returning None if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
 
 def validate_email(email):
     """Basic email validation"""